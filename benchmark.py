@@ -0,0 +1,246 @@
+"""Contains the benchmark suite of the game. Measures the level generation, the solved check, the solver,
+building the map of a level and drawing frames of the map and the menus.
+The game runs headless, so no display is needed. Run it with "python benchmark.py".
+The results can be saved as a JSON baseline with --save and compared against
+a saved baseline with --compare, to find regressions between commits."""
+import os
+os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = "hide"
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+import argparse
+import gc
+import json
+import platform
+import random
+import statistics
+import tempfile
+import time
+import numpy as np
+import pygame
+from control_unit import ControlUnit
+from level_generator import generate_level, generate_chunk, is_solved, get_map_size, CHUNK_SIZE, apply_rotation_deltas
+from chunked_level import ChunkedLevel
+from solver import solve
+from board_code import encode_board, decode_board, encode_rotations, decode_rotations
+
+
+# The first levels with each map size used by the game
+LEVELS_BY_SIZE = {5: 1, 10: 5, 25: 70, 50: 150}
+LARGE_LEVELS_BY_SIZE = {200: 500}  # the first levels with bigger map sizes, only generated and checked
+CHUNKED_LEVEL = 900  # the first level with the biggest map, which is generated chunk by chunk
+STORM_ROTATIONS = 50  # the number of tiles started rotating in every frame of a rotation storm
+REGRESSION_THRESHOLD = 0.1  # how much slower than the baseline a benchmark may get before it counts as a regression
+
+
+class Benchmarks:
+    """Runs the benchmarks on a headless game and collects their statistics."""
+    def __init__(self, repeat, names=None):
+        """Initializes the benchmarks with the number of times each one is measured.
+        Only the benchmarks containing one of the given names are run, all of them if no names are given.
+        :type repeat: int
+        :type names: list"""
+        self.repeat = repeat
+        self.names = names
+        self.results = {}
+        self.directory = tempfile.TemporaryDirectory()
+        self.control_unit = ControlUnit(headless=True,
+                                        save_file_path=os.path.join(self.directory.name, "game_data.json"),
+                                        level_pack_path=os.path.join(self.directory.name, "levels.pack"))
+        self.map = self.control_unit.map
+        self.gui = self.control_unit.gui
+
+    def run(self):
+        """Runs all selected benchmarks, printing the result of each one as soon as it is done.
+        Returns the statistics by the name of the benchmark."""
+        for size, level in LEVELS_BY_SIZE.items():
+            self.measure("generate_level %dx%d" % (size, size), lambda: generate_level(level))
+        for size, level in LARGE_LEVELS_BY_SIZE.items():
+            self.measure("generate_level %dx%d" % (size, size), lambda: generate_level(level))
+        width, height = get_map_size(CHUNKED_LEVEL)
+        self.measure("generate_level %dx%d" % (width, height), lambda: ChunkedLevel(CHUNKED_LEVEL).generate_all())
+        self.measure("generate_chunk %dx%d" % (CHUNK_SIZE, CHUNK_SIZE), lambda: generate_chunk(CHUNKED_LEVEL, (1, 1)))
+        for size, level in LEVELS_BY_SIZE.items():
+            level_map = generate_level(level)
+            self.measure("is_solved %dx%d" % (size, size), lambda: is_solved(level_map))
+        for size, level in LARGE_LEVELS_BY_SIZE.items():
+            level_map = generate_level(level)
+            self.measure("is_solved %dx%d" % (size, size), lambda: is_solved(level_map))
+        if self.is_selected("is_solved %dx%d" % (width, height)):
+            chunks = ChunkedLevel(CHUNKED_LEVEL)
+            chunks.generate_all()
+            self.measure("is_solved %dx%d" % (width, height), lambda: is_solved(chunks.level_map))
+        for size, level in LEVELS_BY_SIZE.items():
+            level_map = generate_level(level)
+            self.measure("solve %dx%d" % (size, size), lambda: solve(level_map))
+        for size, level in LEVELS_BY_SIZE.items():
+            level_map = generate_level(level)
+            self.measure("board code %dx%d" % (size, size), lambda: decode_board(encode_board(level, level_map)))
+        for size, level in LEVELS_BY_SIZE.items():
+            level_map = generate_level(level)
+            code = encode_rotations(np.random.default_rng(0).integers(0, 4, level_map.shape, dtype=np.uint8))
+            self.measure("restore progress %dx%d" % (size, size),
+                         lambda: apply_rotation_deltas(level_map, decode_rotations(code, level_map.shape)))
+        for size, level in LEVELS_BY_SIZE.items():
+            if self.is_selected("update_level_map %dx%d" % (size, size)):
+                self.map.set_level(level)
+                self.measure("update_level_map %dx%d" % (size, size), self.map.update_level_map)
+        self.measure_map_frames()
+        self.measure_menu_frames()
+        self.control_unit.game_data.close()
+        self.control_unit.map.close()
+        pygame.quit()
+        self.directory.cleanup()
+        return self.results
+
+    def measure_map_frames(self):
+        """Measures drawing frames of the map of the biggest level, while nothing moves and during a rotation storm,
+        in which a lot of tiles are started rotating in every frame."""
+        name_idle = "draw_map idle"
+        name_storm = "draw_map rotation storm"
+        if not self.is_selected(name_idle) and not self.is_selected(name_storm):
+            return
+        self.map.set_level(LEVELS_BY_SIZE[50])
+        self.map.draw_map()
+        self.measure(name_idle, self.map.draw_map)
+        rng = random.Random(0)
+        left, top, right, bottom = self.map.camera.get_visible_cells()
+        cells = [(x, y) for x in range(left, right) for y in range(top, bottom) if self.map.level_map[x, y] != 0]
+
+        def storm_frame():
+            for cell in rng.sample(cells, STORM_ROTATIONS):
+                self.map.rotate_tile(self.map.get_tile(cell), True)
+            self.map.draw_map()
+        self.measure(name_storm, storm_frame)
+
+    def measure_menu_frames(self):
+        """Measures drawing frames of the main menu, while nothing changes and while the mouse moves
+        on and off a button, so the button has to be drawn again in every frame."""
+        self.gui.invalidate()
+        self.gui.draw_main_menu()
+        self.measure("gui main menu idle", self.gui.draw_main_menu)
+        button = self.gui.main_menu.buttons[0]
+        x, y = button.get_position()
+        positions = [(x + button.get_width() // 2, y + button.get_height() // 2), (0, 0)]
+        frames = [0]
+
+        def hover_frame():
+            frames[0] += 1
+            self.gui.check_button_hover(positions[frames[0] % 2])
+            self.gui.draw_main_menu()
+        self.measure("gui main menu hover", hover_frame)
+
+    def is_selected(self, name):
+        """Returns True if the benchmark with the given name should be run.
+        :type name: str"""
+        return not self.names or any(n in name for n in self.names)
+
+    def measure(self, name, function):
+        """Measures the given function, if the benchmark with the given name is selected.
+        The function is run a few times before measuring to fill the caches. The garbage collector is
+        disabled while measuring, so it doesn't add random pauses to the results.
+        :type name: str
+        :type function: function"""
+        if not self.is_selected(name):
+            return
+        for _ in range(max(1, self.repeat // 10)):
+            function()
+        times = []
+        gc.collect()
+        gc.disable()
+        try:
+            for _ in range(self.repeat):
+                start = time.perf_counter()
+                function()
+                times.append((time.perf_counter() - start) * 1000)
+        finally:
+            gc.enable()
+        self.results[name] = get_stats(times)
+        print_result(name, self.results[name])
+
+
+def get_stats(times):
+    """Returns the statistics of the given times in milliseconds as a dictionary.
+    The median is used to compare results, since it barely changes when a single run was disturbed.
+    :type times: list"""
+    ordered = sorted(times)
+    return {
+        "runs": len(times),
+        "median": statistics.median(ordered),
+        "mean": statistics.mean(ordered),
+        "min": ordered[0],
+        "p90": ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))],
+        "stdev": statistics.stdev(ordered) if len(ordered) > 1 else 0.0
+    }
+
+
+def print_result(name, stats):
+    """Prints the statistics of a single benchmark as a line of the result table.
+    :type name: str
+    :type stats: dict"""
+    print("%-28s median %9.3f ms   min %9.3f ms   p90 %9.3f ms   stdev %8.3f ms" %
+          (name, stats["median"], stats["min"], stats["p90"], stats["stdev"]))
+
+
+def save_baseline(path, results):
+    """Saves the given results as a JSON baseline at the given path, together with the system they were measured on.
+    :type path: str
+    :type results: dict"""
+    baseline = {
+        "system": {
+            "python": platform.python_version(),
+            "pygame": pygame.version.ver,
+            "numpy": np.__version__,
+            "platform": platform.platform()
+        },
+        "results": results
+    }
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=2)
+
+
+def compare_to_baseline(path, results, threshold=REGRESSION_THRESHOLD):
+    """Compares the medians of the given results to the ones of the baseline at the given path and prints the changes.
+    Returns the names of the benchmarks that got slower than allowed by the threshold.
+    :type path: str
+    :type results: dict
+    :type threshold: float"""
+    with open(path) as f:
+        baseline = json.load(f)["results"]
+    regressions = []
+    print()
+    print("Compared to " + path + ":")
+    for name, stats in results.items():
+        if name not in baseline:
+            print("%-28s not in the baseline" % name)
+            continue
+        ratio = stats["median"] / baseline[name]["median"] if baseline[name]["median"] > 0 else 1.0
+        note = ""
+        if ratio > 1 + threshold:
+            regressions.append(name)
+            note = "  REGRESSION"
+        print("%-28s %9.3f ms -> %9.3f ms  (%+6.1f %%)%s" %
+              (name, baseline[name]["median"], stats["median"], (ratio - 1) * 100, note))
+    return regressions
+
+
+def main():
+    """Parses the command line, runs the benchmarks and saves or compares the results.
+    Exits with status 1 if a benchmark regressed compared to the baseline."""
+    parser = argparse.ArgumentParser(description="Benchmarks of Indefinite Loop")
+    parser.add_argument("names", nargs="*", help="only run the benchmarks containing one of these names")
+    parser.add_argument("--repeat", type=int, default=50, help="how often each benchmark is measured")
+    parser.add_argument("--save", metavar="PATH", help="save the results as a JSON baseline")
+    parser.add_argument("--compare", metavar="PATH", help="compare the results to a JSON baseline")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="how much slower than the baseline counts as a regression, 0.1 meaning 10 %%")
+    args = parser.parse_args()
+    results = Benchmarks(args.repeat, args.names).run()
+    if args.save:
+        save_baseline(args.save, results)
+    if args.compare and compare_to_baseline(args.compare, results, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    # execute only if run as a script
+    main()
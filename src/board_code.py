@@ -0,0 +1,105 @@
+"""Contains the board codes, short texts that describe a board, so it can be saved or shared with other players.
+A board code holds the level number and the current tiles of the board, which tell the rotation of every tile,
+since the tiles themselves follow from the level number. The code starts with a header (format, level number,
+width and height of the map), followed by the tiles packed two per byte, all encoded in URL-safe base64.
+Rotation codes are used to save the progress on a level. Since the level itself can always be generated again,
+they only hold the number of steps every tile was rotated by since it was generated, two bits per tile.
+The rotation code starts with a header (format, generator version, width and height of the map), followed by
+the rotations packed four per byte and compressed, since most tiles of a big map are usually not rotated at all."""
+import base64
+import binascii
+import zlib
+import numpy as np
+from level_generator import GENERATOR_VERSION, TILE_DTYPE, pack_tiles, unpack_tiles, get_packed_size
+
+
+CODE_FORMAT = 1
+ROTATION_CODE_FORMAT = 1
+
+header_dtype = np.dtype([("format", "u1"), ("level", "<u4"), ("width", "<u2"), ("height", "<u2")])
+rotation_header_dtype = np.dtype([("format", "u1"), ("generator_version", "<u4"), ("width", "<u2"),
+                                  ("height", "<u2")])
+
+
+def encode_board(level, level_map):
+    """Returns the board code of the given level with the tiles of the given level map.
+    :type level: int
+    :type level_map: ndarray"""
+    header = np.array([(CODE_FORMAT, level, level_map.shape[0], level_map.shape[1])], dtype=header_dtype)
+    return base64.urlsafe_b64encode(header.tobytes() + pack_tiles(level_map).tobytes()).decode("ascii")
+
+
+def decode_board(code):
+    """Returns the level number and the level map of the given board code.
+    Raises a ValueError if the code is broken or of another format.
+    :type code: str"""
+    data = decode_base64(code)
+    if len(data) < header_dtype.itemsize:
+        raise ValueError("Board code is too short")
+    header = np.frombuffer(data[:header_dtype.itemsize], dtype=header_dtype)[0]
+    if header["format"] != CODE_FORMAT:
+        raise ValueError("Unknown board code format: " + str(header["format"]))
+    shape = (int(header["width"]), int(header["height"]))
+    packed = np.frombuffer(data[header_dtype.itemsize:], dtype=np.uint8)
+    if len(packed) != get_packed_size(shape):
+        raise ValueError("Board code doesn't match the size of its map")
+    return int(header["level"]), unpack_tiles(packed, shape)
+
+
+def encode_rotations(deltas):
+    """Returns the rotation code of the given number of steps every tile was rotated by since it was generated.
+    :type deltas: ndarray"""
+    header = np.array([(ROTATION_CODE_FORMAT, GENERATOR_VERSION, deltas.shape[0], deltas.shape[1])],
+                      dtype=rotation_header_dtype)
+    packed = zlib.compress(pack_rotations(deltas).tobytes())
+    return base64.urlsafe_b64encode(header.tobytes() + packed).decode("ascii")
+
+
+def decode_rotations(code, shape):
+    """Returns the number of steps every tile was rotated by of the given rotation code for a map of the given shape.
+    Raises a ValueError if the code is broken, of another format, for another generator version or another shape.
+    :type code: str
+    :type shape: tuple"""
+    data = decode_base64(code)
+    if len(data) < rotation_header_dtype.itemsize:
+        raise ValueError("Rotation code is too short")
+    header = np.frombuffer(data[:rotation_header_dtype.itemsize], dtype=rotation_header_dtype)[0]
+    if header["format"] != ROTATION_CODE_FORMAT or header["generator_version"] != GENERATOR_VERSION:
+        raise ValueError("Rotation code of another format or generator version")
+    if (int(header["width"]), int(header["height"])) != tuple(shape):
+        raise ValueError("Rotation code doesn't match the size of the map")
+    try:
+        packed = np.frombuffer(zlib.decompress(data[rotation_header_dtype.itemsize:]), dtype=np.uint8)
+    except zlib.error:
+        raise ValueError("Rotation code is broken")
+    if len(packed) != (shape[0] * shape[1] + 3) // 4:
+        raise ValueError("Rotation code doesn't match the size of the map")
+    return unpack_rotations(packed, shape)
+
+
+def pack_rotations(deltas):
+    """Packs the given numbers of steps, which are all below 4, into four per byte, the first one in the lowest bits.
+    :type deltas: ndarray"""
+    steps = np.asarray(deltas, dtype=TILE_DTYPE).ravel()
+    steps = np.append(steps, np.zeros(-len(steps) % 4, dtype=TILE_DTYPE))
+    return steps[0::4] | (steps[1::4] << 2) | (steps[2::4] << 4) | (steps[3::4] << 6)
+
+
+def unpack_rotations(packed, shape):
+    """Unpacks numbers of steps packed by pack_rotations into an array of the given shape.
+    :type packed: ndarray
+    :type shape: tuple"""
+    packed = np.asarray(packed, dtype=TILE_DTYPE)
+    steps = np.empty(len(packed) * 4, dtype=TILE_DTYPE)
+    for i in range(4):
+        steps[i::4] = (packed >> (2 * i)) & 0b11
+    return steps[:shape[0] * shape[1]].reshape(shape)
+
+
+def decode_base64(code):
+    """Returns the bytes of the given code in URL-safe base64. Raises a ValueError if it isn't valid base64.
+    :type code: str"""
+    try:
+        return base64.urlsafe_b64decode(code.strip().encode("ascii"))
+    except (binascii.Error, UnicodeEncodeError):
+        raise ValueError("Not a valid code: " + code)
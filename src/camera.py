@@ -0,0 +1,138 @@
+"""Contains the camera, which decides which part of the map is shown on the screen and how big the tiles are.
+Maps that fit on the screen are shown completely, with the tiles as big as possible. Bigger maps are shown in parts,
+which the player can move around (pan) and make bigger or smaller (zoom).
+The position of the camera is kept in board pixels, meaning pixels on the whole map with the current tile size,
+where the top left corner of the map is (0, 0)."""
+import pygame
+
+
+MIN_TILE_SIZE = 10  # the smallest tiles shown, so that at most this many pixels of the screen show a single tile
+DEFAULT_TILE_SIZE = 20  # the size of the tiles of a map that doesn't fit on the screen when it is shown first
+ZOOM_TILE_SIZES = (10, 14, 20, 28, 40, 56, 80, 112)  # the tile sizes the player can zoom through
+
+
+class Camera:
+    """The camera looking at the map. Translates between cells of the map and positions on the screen."""
+    def __init__(self, viewport_size):
+        """Initializes a new camera showing a map of a single cell on a viewport of the given size in pixels.
+        :type viewport_size: tuple"""
+        self.viewport = pygame.Rect((0, 0), viewport_size)
+        self.board_shape = (1, 1)
+        self.tile_sizes = [min(viewport_size)]
+        self.tile_size = self.tile_sizes[0]
+        self.x = 0
+        self.y = 0
+
+    def set_board(self, board_shape):
+        """Makes the camera look at a new map of the given shape in cells. A map that fits on the screen is shown
+        completely, a bigger one is shown with the default tile size, centered on the middle of the map.
+        :type board_shape: tuple"""
+        self.board_shape = board_shape
+        fitting = min(self.viewport.width // board_shape[0], self.viewport.height // board_shape[1])
+        if fitting >= MIN_TILE_SIZE:
+            self.tile_sizes = [fitting] + [size for size in ZOOM_TILE_SIZES if size > fitting]
+            self.tile_size = fitting
+        else:
+            self.tile_sizes = list(ZOOM_TILE_SIZES)
+            self.tile_size = DEFAULT_TILE_SIZE
+        self.x = 0
+        self.y = 0
+        self.center_on((board_shape[0] // 2, board_shape[1] // 2))
+
+    def get_tile_shape(self):
+        """Returns the width and height of a tile in pixels."""
+        return self.tile_size, self.tile_size
+
+    def get_board_size(self):
+        """Returns the width and height of the whole map in pixels."""
+        return self.board_shape[0] * self.tile_size, self.board_shape[1] * self.tile_size
+
+    def shows_whole_board(self):
+        """Returns True if the whole map is on the screen."""
+        width, height = self.get_board_size()
+        return width <= self.viewport.width and height <= self.viewport.height
+
+    def pan(self, dx, dy):
+        """Moves the camera by the given number of pixels, as far as it can go without leaving the map.
+        Returns how far it actually moved.
+        :type dx: int
+        :type dy: int"""
+        old = (self.x, self.y)
+        self.x += dx
+        self.y += dy
+        self.clamp()
+        return self.x - old[0], self.y - old[1]
+
+    def clamp(self):
+        """Moves the camera back onto the map if it shows anything outside of it."""
+        width, height = self.get_board_size()
+        self.x = min(max(self.x, 0), max(width - self.viewport.width, 0))
+        self.y = min(max(self.y, 0), max(height - self.viewport.height, 0))
+
+    def zoom(self, steps, anchor):
+        """Zooms in (positive steps) or out (negative steps) by the given number of tile sizes, keeping the point
+        of the map at the given position on the screen in place. Returns True if the tile size changed.
+        :type steps: int
+        :type anchor: tuple"""
+        index = min(max(self.tile_sizes.index(self.tile_size) + steps, 0), len(self.tile_sizes) - 1)
+        new_size = self.tile_sizes[index]
+        if new_size == self.tile_size:
+            return False
+        # The point of the map under the anchor, in cells, stays under the anchor
+        cell_x = (self.x + anchor[0]) / self.tile_size
+        cell_y = (self.y + anchor[1]) / self.tile_size
+        self.tile_size = new_size
+        self.x = int(cell_x * new_size) - anchor[0]
+        self.y = int(cell_y * new_size) - anchor[1]
+        self.clamp()
+        return True
+
+    def center_on(self, cell):
+        """Moves the camera so that the given cell is in the middle of the screen, as far as possible.
+        :type cell: tuple"""
+        self.x = cell[0] * self.tile_size + self.tile_size // 2 - self.viewport.width // 2
+        self.y = cell[1] * self.tile_size + self.tile_size // 2 - self.viewport.height // 2
+        self.clamp()
+
+    def get_pan_to(self, cell):
+        """Returns how far the camera has to move, so that the given cell is completely on the screen.
+        :type cell: tuple"""
+        rect = self.get_cell_rect(cell)
+        dx = min(rect.left, 0) + max(rect.right - self.viewport.right, 0)
+        dy = min(rect.top, 0) + max(rect.bottom - self.viewport.bottom, 0)
+        return dx, dy
+
+    def get_visible_cells(self, area=None):
+        """Returns the range of cells that are (partly) in the given area of the screen (the whole screen by default),
+        as the first column, first row, last column plus one and last row plus one.
+        :type area: pygame.Rect"""
+        if area is None:
+            area = self.viewport
+        return (max((self.x + area.left) // self.tile_size, 0),
+                max((self.y + area.top) // self.tile_size, 0),
+                min((self.x + area.right - 1) // self.tile_size + 1, self.board_shape[0]),
+                min((self.y + area.bottom - 1) // self.tile_size + 1, self.board_shape[1]))
+
+    def is_visible(self, cell):
+        """Returns True if the given cell is (partly) on the screen.
+        :type cell: tuple"""
+        return self.viewport.colliderect(self.get_cell_rect(cell))
+
+    def get_cell_rect(self, cell):
+        """Returns the area the cell at the given grid position covers on the screen.
+        :type cell: tuple"""
+        return pygame.Rect(cell[0] * self.tile_size - self.x, cell[1] * self.tile_size - self.y,
+                           self.tile_size, self.tile_size)
+
+    def get_cell_at(self, pos):
+        """Returns the grid position of the cell at the given position on the screen, None if it's outside the map.
+        :type pos: tuple"""
+        cell = ((self.x + pos[0]) // self.tile_size, (self.y + pos[1]) // self.tile_size)
+        if not (0 <= cell[0] < self.board_shape[0] and 0 <= cell[1] < self.board_shape[1]):
+            return None
+        return cell
+
+    def to_screen(self, pos):
+        """Returns the position on the screen of the given position in board pixels.
+        :type pos: tuple"""
+        return pos[0] - self.x, pos[1] - self.y
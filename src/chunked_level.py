@@ -0,0 +1,111 @@
+"""Contains the chunked level, which generates a huge level chunk by chunk, only when a part of it is needed.
+The chunks are generated by version 3 of the level generator, so the level ends up the same as if it was generated
+at once, no matter in which order its chunks are generated. Chunks that weren't generated yet are empty.
+A chunked level can start with the tiles rotated, as they were left when the level was played last. The rotations of
+the chunks that weren't generated yet are kept until they are.
+Chunks can also be generated on a background worker (see complete_level_map) and taken over later."""
+import numpy as np
+from level_generator import generate_chunk, get_chunk_grid_size, get_chunk_slices, get_map_size, CHUNK_SIZE, \
+    TILE_DTYPE, apply_rotation_deltas, get_rotation_deltas
+
+
+LAZY_LEVEL_CELLS = 100000  # levels with more cells than this are generated chunk by chunk
+
+
+class ChunkedLevel:
+    """A level whose chunks are generated when they are needed."""
+    def __init__(self, level, deltas=None):
+        """Initializes a new chunked level with the given number, without any generated chunk.
+        Takes the number of steps every tile is rotated by clockwise once its chunk is generated, if any.
+        :type level: int
+        :type deltas: ndarray"""
+        self.level = level
+        self.start_map = np.zeros(get_map_size(level), dtype=TILE_DTYPE)  # the tiles the way they were generated
+        self.level_map = np.zeros(get_map_size(level), dtype=TILE_DTYPE)
+        self.deltas = deltas if deltas is not None else np.zeros(self.level_map.shape, dtype=TILE_DTYPE)
+        self.generated = np.zeros(get_chunk_grid_size(self.level_map.shape), dtype=bool)
+
+    def generate_area(self, left, top, right, bottom):
+        """Generates all chunks touching the given range of cells that weren't generated yet,
+        given as the first column, first row, last column plus one and last row plus one.
+        Returns the ranges of cells of the chunks that were generated, in the same form.
+        :type left: int
+        :type top: int
+        :type right: int
+        :type bottom: int"""
+        areas = []
+        if left >= right or top >= bottom:
+            return areas
+        missing = np.argwhere(~self.generated[left // CHUNK_SIZE:(right - 1) // CHUNK_SIZE + 1,
+                                              top // CHUNK_SIZE:(bottom - 1) // CHUNK_SIZE + 1])
+        for cx, cy in missing + (left // CHUNK_SIZE, top // CHUNK_SIZE):
+            areas.append(self.generate_chunk((int(cx), int(cy))))
+        return areas
+
+    def generate_all(self):
+        """Generates all chunks that weren't generated yet. Returns the ranges of cells of the generated chunks."""
+        return self.generate_area(0, 0, self.level_map.shape[0], self.level_map.shape[1])
+
+    def generate_chunk(self, chunk):
+        """Generates the given chunk into the level map. Returns the range of its cells.
+        :type chunk: tuple"""
+        return self.add_chunk(chunk, generate_chunk(self.level, chunk))
+
+    def add_chunk(self, chunk, tiles):
+        """Puts the given tiles, generated for the given chunk, into the level map, rotated the way they are kept
+        for the chunk. Returns the range of its cells, None if the chunk was already generated.
+        :type chunk: tuple
+        :type tiles: ndarray"""
+        if self.generated[chunk]:
+            return None
+        xs, ys = get_chunk_slices(self.level_map.shape, chunk)
+        self.start_map[xs, ys] = tiles
+        self.level_map[xs, ys] = apply_rotation_deltas(tiles, self.deltas[xs, ys])
+        self.generated[chunk] = True
+        return xs.start, ys.start, xs.stop, ys.stop
+
+    def get_missing_chunks(self):
+        """Returns the chunks that weren't generated yet."""
+        return [(int(cx), int(cy)) for cx, cy in np.argwhere(~self.generated)]
+
+    def get_rotation_deltas(self):
+        """Returns the number of steps every tile was rotated by clockwise since it was generated,
+        including the rotations kept for the chunks that weren't generated yet."""
+        width, height = self.level_map.shape
+        cells = np.repeat(np.repeat(self.generated, CHUNK_SIZE, axis=0), CHUNK_SIZE, axis=1)[:width, :height]
+        deltas = self.deltas.copy()
+        deltas[cells] = get_rotation_deltas(self.start_map[cells], self.level_map[cells])
+        return deltas
+
+    def is_complete(self):
+        """Returns True if all chunks were generated."""
+        return bool(self.generated.all())
+
+
+def complete_level_map(level, level_map, deltas, chunks, cancel=None):
+    """Generates the given chunks of the level with the given number into the given level map, rotated by the given
+    number of steps for their cells, the way a chunked level does. Meant for background workers, which work on a copy
+    of the level map, so the chunked level only has to take over the generated chunks (see ChunkedLevel.add_chunk).
+    Returns the generated chunks together with their tiles the way they were generated.
+    Stops early if the given cancel event was set.
+    :type level: int
+    :type level_map: ndarray
+    :type deltas: ndarray
+    :type chunks: list
+    :type cancel: threading.Event"""
+    generated = []
+    for chunk in chunks:
+        if cancel is not None and cancel.is_set():
+            break
+        tiles = generate_chunk(level, chunk)
+        xs, ys = get_chunk_slices(level_map.shape, chunk)
+        level_map[xs, ys] = apply_rotation_deltas(tiles, deltas[xs, ys])
+        generated.append((chunk, tiles))
+    return generated
+
+
+def is_generated_lazily(level):
+    """Returns True if the level with the given number is big enough to be generated chunk by chunk.
+    :type level: int"""
+    width, height = get_map_size(level)
+    return width * height > LAZY_LEVEL_CELLS
@@ -5,3 +5,4 @@ black = (0, 0, 0)
 white = (255, 255, 255)
 red = (255, 40, 40)
 green = (0, 128, 0)
+yellow = (255, 220, 0)
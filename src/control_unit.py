@@ -4,68 +4,201 @@ Uses the Map class to keep track of the tiles and their rotation, as well as ren
 Calls the GUI class for menu rendering and the Map class for in-game rendering."""
 import pygame
 import os
+import time
 import events
 from enums import GameState
 from gui import GUI
 from game_data import GameData
 from map import Map
+from level_store import LevelStore
+from input_script import InputScript
+from frame_stats import FrameStats
+from performance_overlay import PerformanceOverlay
 import resource_locations as res
 import music
 from music import SoundManager
+from resource_manager import resources
+
+
+IDLE_TIMEOUT = 500  # the longest time in milliseconds to wait for an event while nothing is moving on the screen
+FRAME_STATS_FILE = "frame_stats.csv"  # the file the frame statistics are exported to
+BOARD_CODE_FILE = "board_code.txt"  # the file the board code of the current board is exported to and imported from
 
 
 class ControlUnit:
     """The control unit of the game. Keeps track of the game state, executes the game loop
     and calls GUI and Map classes where needed."""
-    def __init__(self):
+    def __init__(self, headless=False, input_script=None, fixed_step=None, save_file_path="game_data.json",
+                 level_pack_path="levels.pack"):
         """Initializes the control unit and the game itself. Sets variables like window position, size,
-        and initializes the GUI class"""
-        self.FPS = 60
+        and initializes the GUI class.
+        A headless game uses the dummy video and audio drivers of SDL, so it doesn't need a display,
+        runs at the maximum frame rate without ever waiting for events and plays no music.
+        The given input script is fed into the game while it runs. If a fixed step in milliseconds is given,
+        the game time advances by exactly that much per frame, no matter how long the frame actually took,
+        so scripted runs are reproducible.
+        :type headless: bool
+        :type input_script: InputScript
+        :type fixed_step: int
+        :type save_file_path: str
+        :type level_pack_path: str"""
+        self.headless = headless
+        self.input_script = input_script
+        self.fixed_step = fixed_step
+        self.FPS = 0 if headless else 60
         self.clock = pygame.time.Clock()
+        self.frame = 0
+        self.start_ticks = 0
         self.state = GameState.MainMenu
+        self.rendered_state = None
         self.running = False
+        self.needs_render = True
+        self.idle_time = 0.0
+        self.start_time = time.perf_counter()
         self.screen_dimensions = (1000, 1000)
         os.environ['SDL_VIDEO_WINDOW_POS'] = "0,30"
+        if headless:
+            os.environ['SDL_VIDEODRIVER'] = "dummy"
+            os.environ['SDL_AUDIODRIVER'] = "dummy"
         pygame.init()
         self.screen = pygame.display.set_mode(self.screen_dimensions)
-        program_icon = pygame.image.load(res.ICON_LOOP)
-        pygame.display.set_icon(program_icon)
+        resources.preload_all()
+        pygame.display.set_icon(resources.get_image(res.ICON_LOOP))
         pygame.display.set_caption("Indefinite Loop")
-        self.game_data = GameData("game_data.json")
+        self.game_data = GameData(save_file_path)
         self.gui = GUI(self.screen, self.game_data)
-        self.map = Map(self.screen, self.game_data)
+        self.map = Map(self.screen, self.game_data, LevelStore(level_pack_path))
         self.sound = SoundManager(self.game_data)
+        self.frame_stats = FrameStats()
+        self.overlay = PerformanceOverlay(self.screen, self.frame_stats, self.map.levels, self.get_idle_ratio)
 
-    def game_loop(self):
-        """Starts the game loop."""
+    def game_loop(self, max_frames=None):
+        """Starts the game loop. Runs at the full frame rate while something is moving on the screen.
+        Otherwise blocks until the next event arrives and only renders again after an event has been handled.
+        The game loop doesn't block while an input script is running. A headless game never blocks
+        and ends by itself once its input script is finished and nothing moves or happens anymore.
+        If a maximum number of frames is given, the game loop ends after that many frames at the latest.
+        :type max_frames: int"""
         self.running = True
-        music.load_music(res.MUSIC_BACKGROUND)
-        self.sound.play_music()
+        self.start_time = time.perf_counter()
+        self.start_ticks = pygame.time.get_ticks()
+        self.frame = 0
+        if not self.headless:
+            music.load_music(res.MUSIC_BACKGROUND)
+            self.sound.play_music()
         while self.running:
-            self.clock.tick(self.FPS)
-            self.render()
-            self.run_events()
+            self.game_data.flush_if_due()
+            self.post_scripted_events()
+            if self.headless or self.is_animating() or self.is_script_running():
+                self.clock.tick(self.FPS)
+                self.render()
+                self.frame += 1
+                self.run_events(pygame.event.get())
+                if self.is_done(max_frames):
+                    self.running = False
+                continue
+            if self.needs_render:
+                self.render()
+                self.needs_render = False
+            self.run_events(self.wait_for_events())
+        self.map.close()
+        self.game_data.close()
+
+    def get_game_time(self):
+        """Returns the time in milliseconds since the game loop started. Advances by the fixed step per frame,
+        if there is one."""
+        if self.fixed_step is not None:
+            return self.frame * self.fixed_step
+        return pygame.time.get_ticks() - self.start_ticks
+
+    def post_scripted_events(self):
+        """Posts the events of the input script that are due to the pygame event queue."""
+        if self.input_script is None:
+            return
+        for event in self.input_script.get_due_events(self.get_game_time()):
+            pygame.event.post(event)
+
+    def is_done(self, max_frames):
+        """Returns True if the game loop should end by itself, because the maximum number of frames is reached
+        or because a headless game has nothing left to do.
+        :type max_frames: int"""
+        if max_frames is not None and self.frame >= max_frames:
+            return True
+        if not self.headless or self.is_animating() or pygame.event.peek():
+            return False
+        return not self.is_script_running()
+
+    def is_script_running(self):
+        """Returns True if there are events left in the input script, so the game loop must not block."""
+        return self.input_script is not None and not self.input_script.is_finished()
+
+    def is_animating(self):
+        """Returns True if something is moving on the screen, so the game loop needs to run at the full frame rate."""
+        if self.state == GameState.InGameMode0 and self.map.is_animating():
+            return True
+        return music.is_transitioning()
+
+    def wait_for_events(self):
+        """Blocks until an event arrives or the idle timeout passes. Returns the events that arrived.
+        The time spent waiting is counted as idle time."""
+        start = time.perf_counter()
+        event = pygame.event.wait(IDLE_TIMEOUT)
+        self.idle_time += time.perf_counter() - start
+        if event.type == pygame.NOEVENT:
+            return []
+        return [event] + pygame.event.get()
+
+    def get_idle_ratio(self):
+        """Returns the share of the time since the game loop started that was spent waiting for events."""
+        total = time.perf_counter() - self.start_time
+        if total <= 0:
+            return 0.0
+        return self.idle_time / total
 
     def render(self):
-        """Renders what's on the screen, depending on the game state. Calls either the GUI or the Map class."""
-        if self.state == GameState.MainMenu:
-            self.gui.draw_main_menu()
+        """Renders what's on the screen, depending on the game state. Calls either the GUI or the Map class.
+        Only the parts of the screen that changed are updated on the display.
+        Everything is drawn completely again after the game state changed.
+        Every call begins a new frame in the frame statistics, and the time each phase takes is recorded."""
+        level_stats = self.map.levels.get_stats()
+        self.frame_stats.begin_frame(self.map.level, level_stats["generated"], len(resources.get_load_times()))
+        if self.state != self.rendered_state:
+            self.rendered_state = self.state
+            self.map.invalidate()
+            self.gui.invalidate()
+        dirty = self.overlay.remove()
+        start = time.perf_counter()
         if self.state == GameState.InGameMode0:
-            self.map.draw_map()
-        if self.state == GameState.PausedGameMode0:
-            self.map.draw_map()
-            self.gui.draw_pause_menu()
-        if self.state == GameState.SettingsScreen:
-            self.gui.draw_settings_menu()
-        if self.state == GameState.HowToScreen:
-            self.gui.draw_how_to()
-        pygame.display.flip()
-
-    def run_events(self):
-        """Checks for all the events pygame might have fired."""
-        for event in pygame.event.get():
+            dirty += self.map.draw_map()
+            self.frame_stats.add_time("map", time.perf_counter() - start)
+        else:
+            if self.state == GameState.MainMenu:
+                dirty += self.gui.draw_main_menu()
+            if self.state == GameState.PausedGameMode0:
+                dirty += self.gui.draw_pause_menu()
+            if self.state == GameState.SettingsScreen:
+                dirty += self.gui.draw_settings_menu()
+            if self.state == GameState.HowToScreen:
+                dirty += self.gui.draw_how_to()
+            self.frame_stats.add_time("gui", time.perf_counter() - start)
+        dirty += self.overlay.draw()
+        start = time.perf_counter()
+        pygame.display.update(dirty)
+        self.frame_stats.add_time("display", time.perf_counter() - start)
+
+    def run_events(self, event_list):
+        """Handles the given events pygame has fired.
+        :type event_list: list"""
+        start = time.perf_counter()
+        for event in event_list:
+            self.needs_render = True
             if event.type == pygame.QUIT:
                 self.running = False
+            if event.type == pygame.KEYDOWN and event.key in (pygame.K_F3, pygame.K_F4):
+                self.handle_performance_key(event.key)
+                continue
+            if event.type == pygame.KEYUP and event.key in (pygame.K_F3, pygame.K_F4):
+                continue
             if self.state == GameState.MainMenu:
                 self.handle_event_main_menu(event)
             if self.state == GameState.InGameMode0:
@@ -76,6 +209,29 @@ class ControlUnit:
                 self.handle_event_settings_screen(event)
             if self.state == GameState.HowToScreen:
                 self.handle_event_how_to(event)
+        self.frame_stats.add_time("events", time.perf_counter() - start)
+
+    def handle_performance_key(self, key):
+        """Handles the keys for looking at the performance of the game in any game state.
+        F3 shows or hides the performance overlay, F4 exports the frame statistics to a CSV file.
+        :type key: int"""
+        if key == pygame.K_F3:
+            self.overlay.toggle()
+        if key == pygame.K_F4:
+            self.frame_stats.export_csv(FRAME_STATS_FILE)
+
+    def handle_board_code_key(self, key):
+        """Handles the keys for sharing boards in game. Ctrl + C exports the board code of the current board
+        to a file, Ctrl + V loads the board of the code in that file. Broken codes are ignored.
+        :type key: int"""
+        if key == pygame.K_c:
+            self.map.export_board_code(BOARD_CODE_FILE)
+        if key == pygame.K_v:
+            try:
+                with open(BOARD_CODE_FILE) as f:
+                    self.map.load_board_code(f.read())
+            except (IOError, ValueError):
+                pass
 
     def handle_menu_events(self, event, mouse):
         """Handles all events that occur in any GUI menu (mouse events mostly)
@@ -88,7 +244,7 @@ class ControlUnit:
 
     def handle_event_main_menu(self, event):
         """Handles all events that need to be handled in the main menu."""
-        mouse = pygame.mouse.get_pos()
+        mouse = get_mouse_pos(event)
         self.handle_menu_events(event, mouse)
         if event.type == events.START_GAME_MODE_0:
             self.state = GameState.InGameMode0
@@ -99,16 +255,32 @@ class ControlUnit:
             self.state = GameState.HowToScreen
 
     def handle_event_in_game(self, event):
-        """Handles all events that need to be handled in game."""
-        mouse = pygame.mouse.get_pos()
+        """Handles all events that need to be handled in game.
+        Clicks of an input script carry the modifier keys held with them,
+        the state of the keyboard is used for other clicks."""
+        mouse = get_mouse_pos(event)
         if event.type == pygame.MOUSEBUTTONUP:
-            self.map.handle_click(mouse, event.button)
+            self.map.handle_click(mouse, event.button, getattr(event, "mod", pygame.key.get_mods()))
+        if event.type == pygame.MOUSEBUTTONDOWN:
+            self.map.handle_mouse_down(event.button)
+        if event.type == pygame.MOUSEMOTION and hasattr(event, "rel"):
+            self.map.handle_mouse_motion(event.rel)
+        if event.type == pygame.MOUSEWHEEL:
+            self.map.handle_wheel(mouse, event.y)
+        if event.type == pygame.KEYDOWN and event.mod & pygame.KMOD_CTRL:
+            self.handle_board_code_key(event.key)
+        if event.type == pygame.KEYDOWN:
+            self.map.handle_key(event.key, event.mod)
+        if event.type == pygame.KEYUP:
+            self.map.handle_key_up(event.key)
         if event.type == pygame.KEYUP and event.key == pygame.K_ESCAPE:
+            self.map.stop_moving()
+            self.map.save_progress()
             self.state = GameState.PausedGameMode0
 
     def handle_event_paused(self, event):
         """Handles all events that need to be handled while paused."""
-        mouse = pygame.mouse.get_pos()
+        mouse = get_mouse_pos(event)
         self.handle_menu_events(event, mouse)
         if event.type == events.EXIT_PAUSE:
             self.state = GameState.InGameMode0
@@ -119,7 +291,7 @@ class ControlUnit:
 
     def handle_event_settings_screen(self, event):
         """Handles all events that need to be handled in the settings screen."""
-        mouse = pygame.mouse.get_pos()
+        mouse = get_mouse_pos(event)
         self.handle_menu_events(event, mouse)
         if event.type == events.BACK_TO_MAIN_MENU:
             self.state = GameState.MainMenu
@@ -128,3 +300,12 @@ class ControlUnit:
         """Handles all events in the how-to screen."""
         if event.type == pygame.MOUSEBUTTONUP or event.type == pygame.KEYUP:
             self.state = GameState.MainMenu
+
+
+def get_mouse_pos(event):
+    """Returns the position of the mouse for the given event. Uses the position stored in the event if it has one,
+    which is also the case for scripted events, and asks pygame for the current position otherwise.
+    :type event: Event"""
+    if hasattr(event, "pos"):
+        return event.pos
+    return pygame.mouse.get_pos()
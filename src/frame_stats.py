@@ -0,0 +1,106 @@
+"""Contains the frame statistics, which keep the timings of the last frames in a ring buffer.
+Every frame records how long handling the events, drawing the map, drawing the GUI and updating the display took,
+together with the current level and how many levels were generated and resources loaded so far,
+so that hitches can be tied to level generation or loading resources.
+The buffer can be exported to a CSV file at any time."""
+import csv
+import time
+import numpy as np
+
+
+FRAME_HISTORY = 1000  # the number of frames kept in the ring buffer
+PHASES = ("events", "map", "gui", "display")  # the timed phases of a frame
+
+frame_dtype = np.dtype([("time", "f8"), ("interval", "f8")] + [(phase, "f8") for phase in PHASES] +
+                       [("level", "i4"), ("generated_levels", "i4"), ("loaded_resources", "i4")])
+
+
+class FrameStats:
+    """Records the timings of the phases of every frame in a ring buffer of a fixed size."""
+    def __init__(self, size=FRAME_HISTORY):
+        """Initializes new empty frame statistics, keeping the given number of frames.
+        :type size: int"""
+        self.frames = np.zeros(size, dtype=frame_dtype)
+        self.count = 0
+        self.start_time = time.perf_counter()
+        self.frame_start = None
+        self.current = np.zeros(1, dtype=frame_dtype)[0]  # the frame being recorded
+
+    def begin_frame(self, level, generated_levels, loaded_resources):
+        """Stores the last frame in the ring buffer and starts recording a new one with the given state of the game.
+        A frame lasts until the next one begins, so the events handled after drawing a frame belong to that frame.
+        The time since the start of the last frame is the interval of the new frame.
+        :type level: int
+        :type generated_levels: int
+        :type loaded_resources: int"""
+        now = time.perf_counter()
+        if self.frame_start is not None:
+            self.frames[self.count % len(self.frames)] = self.current
+            self.count += 1
+        self.current = np.zeros(1, dtype=frame_dtype)[0]
+        self.current["time"] = now - self.start_time
+        if self.frame_start is not None:
+            self.current["interval"] = now - self.frame_start
+        self.current["level"] = level
+        self.current["generated_levels"] = generated_levels
+        self.current["loaded_resources"] = loaded_resources
+        self.frame_start = now
+
+    def add_time(self, phase, duration):
+        """Adds the given duration in seconds to the given phase of the current frame.
+        :type phase: str
+        :type duration: float"""
+        self.current[phase] += duration
+
+    def get_frames(self):
+        """Returns the recorded frames from the oldest to the newest, without the frame that is still being recorded."""
+        if self.count <= len(self.frames):
+            return self.frames[:self.count]
+        split = self.count % len(self.frames)
+        return np.concatenate((self.frames[split:], self.frames[:split]))
+
+    def get_frame_times(self, frames=None):
+        """Returns the time in seconds the given frames (all recorded frames if none are given) spent working,
+        meaning the sum of their phases, without the time spent waiting for the next frame.
+        :type frames: ndarray"""
+        if frames is None:
+            frames = self.get_frames()
+        return sum(frames[phase] for phase in PHASES)
+
+    def get_fps(self, period=1.0):
+        """Returns the number of frames per second during the given last period in seconds.
+        :type period: float"""
+        frames = self.get_frames()
+        if len(frames) < 2:
+            return 0.0
+        recent = frames[frames["time"] > frames["time"][-1] - period]
+        duration = recent["interval"][1:].sum()
+        if duration <= 0:
+            return 0.0
+        return (len(recent) - 1) / duration
+
+    def get_percentile(self, percentile):
+        """Returns the given percentile of the frame times in seconds.
+        :type percentile: float"""
+        if self.count == 0:
+            return 0.0
+        return float(np.percentile(self.get_frame_times(), percentile))
+
+    def get_phase_means(self, count=60):
+        """Returns the mean time in seconds of every phase during the given number of last frames, by phase.
+        :type count: int"""
+        frames = self.get_frames()[-count:]
+        if len(frames) == 0:
+            return {phase: 0.0 for phase in PHASES}
+        return {phase: float(frames[phase].mean()) for phase in PHASES}
+
+    def export_csv(self, path):
+        """Writes all recorded frames to a CSV file at the given path, times in milliseconds.
+        :type path: str"""
+        frames = self.get_frames()
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(frame_dtype.names)
+            for frame in frames:
+                writer.writerow(["%.3f" % (frame[name] * 1000) if frame_dtype[name].kind == 'f' else int(frame[name])
+                                 for name in frame_dtype.names])
@@ -1,8 +1,22 @@
-"""A helper class to handle saved game data on the device. Uses JSON encoding to read and write data."""
+"""A helper class to handle saved game data on the device. Uses JSON encoding to read and write data.
+Changes are only written to the save file once no further change happened for a short time, or on flush.
+The writing itself happens on a background thread, which replaces the save file atomically,
+so a crash while saving never leaves a half written save file behind.
+A snapshot that can't be written (for example because the disk is full) is logged and written again
+on the next save or flush."""
 import json
+import logging
+import os
+import time
+from threading import Thread, Condition
 from enums import GameStyle
 
 
+FLUSH_DELAY = 1.0  # seconds without changes after which the changed data is written to the save file
+
+logger = logging.getLogger(__name__)
+
+
 class GameData:
     """The class that handles data reading/writing."""
     def __init__(self, save_file_path):
@@ -10,16 +24,35 @@ class GameData:
         If the save file does not exist, a new one will be created.
         :type save_file_path: str"""
         self.file_path = save_file_path
-        try:
-            with open(self.file_path) as json_file:
-                self.data = json.load(json_file)
-        except IOError:
-            self.data = {}
+        self.dirty = False
+        self.last_change = 0.0
+        self.data = load_save_file(self.file_path)
+        self.writer = SaveWriter(self.file_path)
+        self.writer.start()
 
     def save(self):
-        """Saves the current data to the JSON file"""
-        with open(self.file_path, 'w') as f:
-            json.dump(self.data, f)
+        """Hands a snapshot of the current data to the background writer, which saves it to the JSON file."""
+        self.writer.submit(json.dumps(self.data))
+        self.dirty = False
+
+    def flush(self):
+        """Saves the data right away if it changed since it was last saved.
+        Otherwise writes the last saved data again if writing it failed."""
+        if self.dirty:
+            self.save()
+        else:
+            self.writer.retry()
+
+    def close(self):
+        """Saves the data if it changed and waits until everything is written. Called when the game quits."""
+        self.flush()
+        self.writer.stop()
+
+    def flush_if_due(self):
+        """Saves the data if it changed and no further change happened for FLUSH_DELAY seconds.
+        Called regularly by the game loop, so that several changes in a row are written only once."""
+        if self.dirty and time.monotonic() - self.last_change >= FLUSH_DELAY:
+            self.save()
 
     def get_max_level(self):
         """Returns the maximum unlocked level number"""
@@ -72,15 +105,146 @@ class GameData:
         :type value: bool"""
         self.set("sound", value)
 
+    def get_board_progress(self, level):
+        """Returns the rotation code of the progress on the given level, None if there is none.
+        :type level: int"""
+        return self.get_or_default("boards", {}).get(str(level))
+
+    def set_board_progress(self, level, code):
+        """Sets the rotation code of the progress on the given level, or removes the progress if the code is None.
+        :type level: int
+        :type code: str"""
+        boards = dict(self.get_or_default("boards", {}))
+        if code is None:
+            boards.pop(str(level), None)
+        else:
+            boards[str(level)] = code
+        self.set("boards", boards)
+
     def get_or_default(self, key, default_value):
         """Generic method to either return a value if it's already present
-        or set it to a default value before returning that."""
+        or set it to a default value before returning that. Never writes to the save file."""
         if key not in self.data:
             self.data[key] = default_value
-        self.save()
         return self.data[key]
 
     def set(self, key, value):
-        """Sets a value for the given key and saves."""
+        """Sets a value for the given key. If the value changed, the data will be saved after FLUSH_DELAY seconds."""
+        if key in self.data and self.data[key] == value:
+            return
         self.data[key] = value
-        self.save()
+        self.dirty = True
+        self.last_change = time.monotonic()
+
+
+class SaveWriter(Thread):
+    """A background thread that writes snapshots of the game data to the save file.
+    Only the latest snapshot that is waiting to be written is kept, older ones are dropped.
+    A snapshot that couldn't be written is kept until a newer one is submitted or it is retried."""
+    def __init__(self, file_path):
+        """Initializes a new save writer for the save file at the given path.
+        :type file_path: str"""
+        Thread.__init__(self, name="save-writer", daemon=True)
+        self.file_path = file_path
+        self.condition = Condition()
+        self.pending = None
+        self.failed = None  # the last snapshot that couldn't be written, if no newer one was submitted since
+        self.stopped = False
+
+    def submit(self, snapshot):
+        """Hands the given snapshot (the JSON encoded data) to the writer, replacing any snapshot not written yet.
+        :type snapshot: str"""
+        with self.condition:
+            self.pending = snapshot
+            self.failed = None
+            self.condition.notify()
+
+    def retry(self):
+        """Hands the last snapshot that couldn't be written to the writer again, if no newer one was submitted."""
+        with self.condition:
+            if self.failed is not None and self.pending is None:
+                self.pending = self.failed
+                self.failed = None
+                self.condition.notify()
+
+    def run(self):
+        """Writes the submitted snapshots until the writer is stopped and nothing is left to write.
+        Errors while writing are logged and don't stop the writer."""
+        while True:
+            with self.condition:
+                while self.pending is None and not self.stopped:
+                    self.condition.wait()
+                if self.pending is None:
+                    return
+                snapshot = self.pending
+                self.pending = None
+            try:
+                write_atomically(self.file_path, snapshot)
+            except OSError:
+                logger.exception("Couldn't write the save file " + self.file_path)
+                with self.condition:
+                    if self.pending is None:
+                        self.failed = snapshot
+
+    def stop(self):
+        """Stops the writer after the last submitted snapshot has been written and waits for that."""
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+        self.join()
+
+
+def get_temp_path(file_path):
+    """Returns the path of the temporary file used while writing the save file at the given path.
+    :type file_path: str"""
+    return file_path + ".tmp"
+
+
+def write_atomically(file_path, content):
+    """Writes the content to a temporary file, makes sure it is on the disk and then renames it to the given path.
+    The file at the given path thereby always contains either the old or the new content, never a part of it.
+    Raises an OSError if writing failed, after removing the temporary file.
+    :type file_path: str
+    :type content: str"""
+    temp_path = get_temp_path(file_path)
+    try:
+        with open(temp_path, 'w') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, file_path)
+    except OSError:
+        remove_file(temp_path)
+        raise
+
+
+def remove_file(file_path):
+    """Removes the file at the given path, if it can be removed.
+    :type file_path: str"""
+    try:
+        os.remove(file_path)
+    except OSError:
+        pass
+
+
+def load_save_file(file_path):
+    """Loads the data from the save file at the given path. Recovers from a crash while saving:
+    a complete temporary file is newer than the save file and is used instead, a partial one is removed.
+    Returns an empty dictionary if there is no usable save file.
+    :type file_path: str"""
+    temp_path = get_temp_path(file_path)
+    for path in (temp_path, file_path):
+        try:
+            with open(path) as json_file:
+                data = json.load(json_file)
+        except IOError:
+            continue
+        except ValueError:
+            data = None
+        if isinstance(data, dict):
+            if path == temp_path:
+                os.replace(temp_path, file_path)
+            return data
+        if path == temp_path:
+            remove_file(temp_path)
+    return {}
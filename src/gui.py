@@ -8,43 +8,35 @@ from button import Button
 from game_data import GameData
 from utility import center_horizontally, left_of, right_of
 from text_button import TextButton
-from colors import black, white, red
+from colors import white, red
 import resource_locations as res
 from pygame import Surface
 from enums import GameStyle
 from music import SoundManager
+from menu import Menu
+from resource_manager import resources
 import music
 
 
-def scale_image_button(src):
-    """Loads the image from the given file path and scales it to the size of an image button"""
-    return pygame.transform.scale(pygame.image.load(src), (30, 30))
+def scale_image_button(src, flip=False):
+    """Returns the image from the given file path scaled to the size of an image button, flipped horizontally if needed.
+    The image is loaded through the resource manager on its first use."""
+    return resources.get_image(src, (30, 30), flip)
 
 
 menu_fonts = ["Comic Sans MS", "Segoe Print"]
-img_arrow_right = scale_image_button(res.IMG_ARROW_RIGHT)
-img_arrow_right_hover = scale_image_button(res.IMG_ARROW_RIGHT_HOVER)
-img_arrow_left = pygame.transform.flip(img_arrow_right, True, False)
-img_arrow_left_hover = pygame.transform.flip(img_arrow_right_hover, True, False)
-img_music_on = scale_image_button(res.IMG_MUSIC_ON)
-img_music_on_hover = scale_image_button(res.IMG_MUSIC_ON_HOVER)
-img_music_off = scale_image_button(res.IMG_MUSIC_OFF)
-img_music_off_hover = scale_image_button(res.IMG_MUSIC_OFF_HOVER)
-img_sound_on = scale_image_button(res.IMG_SOUND_ON)
-img_sound_on_hover = scale_image_button(res.IMG_SOUND_ON_HOVER)
-img_sound_off = scale_image_button(res.IMG_SOUND_OFF)
-img_sound_off_hover = scale_image_button(res.IMG_SOUND_OFF_HOVER)
+LEVEL_ARROW_DISTANCE = 20  # the gap between the level arrows and the level text
 
 
 # Use like this: music_button_images[is_on][is_hover]
 music_button_images = {
     True: {
-        False: img_music_on,
-        True: img_music_on_hover
+        False: res.IMG_MUSIC_ON,
+        True: res.IMG_MUSIC_ON_HOVER
     },
     False: {
-        False: img_music_off,
-        True: img_music_off_hover
+        False: res.IMG_MUSIC_OFF,
+        True: res.IMG_MUSIC_OFF_HOVER
     }
 }
 
@@ -52,12 +44,12 @@ music_button_images = {
 # Use like this: sound_button_images[is_on][is_hover]
 sound_button_images = {
     True: {
-        False: img_sound_on,
-        True: img_sound_on_hover
+        False: res.IMG_SOUND_ON,
+        True: res.IMG_SOUND_ON_HOVER
     },
     False: {
-        False: img_sound_off,
-        True: img_sound_off_hover
+        False: res.IMG_SOUND_OFF,
+        True: res.IMG_SOUND_OFF_HOVER
     }
 }
 
@@ -76,71 +68,74 @@ class GUI:
         self.game_data = game_data
         self.sound = SoundManager(self.game_data)
         self.screen_dimensions = screen.get_size()
-        self.main_menu_surface = None
-        self.pause_menu_surface = None
-        self.settings_menu_surface = None
+        self.main_menu = None
+        self.pause_menu = None
+        self.settings_menu = None
+        self.how_to_drawn = False
         # 0: Level button, 1: Level down button, 2: Level up button
         self.level_buttons = []
-        self.click_sound = pygame.mixer.Sound(res.SOUND_CLICK)
+        self.click_sound = resources.get_sound(res.SOUND_CLICK)
         # 0: Style button, 1: Music button, 2: Sound button
         self.settings_buttons = []
 
     def draw_main_menu(self):
-        """Draws the main menu onto the screen each frame."""
-        if self.main_menu_surface is None:
+        """Draws the main menu onto the screen each frame. Returns the dirty rects."""
+        if self.main_menu is None:
             self.init_main_menu_surface()
-        self.main_menu_surface.fill(black)
-        self.draw_title()
-        for button in self.enabled_buttons():
-            self.main_menu_surface.blit(button.get_rendered_button(), button.get_position())
-        self.screen.blit(self.main_menu_surface, (0, 0))
+        self.buttons = self.main_menu.buttons
+        return self.main_menu.draw()
 
     def draw_pause_menu(self):
-        """Draws the pause menu over the game screen."""
-        if self.pause_menu_surface is None:
+        """Draws the pause menu over the game screen. Returns the dirty rects."""
+        if self.pause_menu is None:
             self.init_pause_menu()
-        self.screen.blit(self.pause_menu_surface, (0, 0))
-        title = text_helper.create_text("Pause", menu_fonts, 50, white)
-        self.screen.blit(title, (center_horizontally(title, self.screen_dimensions), 50))
-        for button in self.buttons:
-            self.screen.blit(button.get_rendered_button(), button.get_position())
+        self.buttons = self.pause_menu.buttons
+        return self.pause_menu.draw()
 
     def draw_settings_menu(self):
-        """Draws the settings menu."""
-        if self.settings_menu_surface is None:
+        """Draws the settings menu. Returns the dirty rects."""
+        if self.settings_menu is None:
             self.init_settings_menu()
-        self.settings_menu_surface.fill(black)
-        title = text_helper.create_text("Settings", menu_fonts, 50, white)
-        self.settings_menu_surface.blit(title, (center_horizontally(title, self.screen_dimensions), 50))
-        for button in self.buttons:
-            self.settings_menu_surface.blit(button.get_rendered_button(), button.get_position())
-        self.screen.blit(self.settings_menu_surface, (0, 0))
+        self.buttons = self.settings_menu.buttons
+        return self.settings_menu.draw()
 
     def draw_how_to(self):
-        """Draws the how-to screen."""
-        howto = pygame.image.load(res.IMG_HOW_TO)
+        """Draws the how-to screen. It doesn't change, so it is only drawn once after it has been opened.
+        Returns the dirty rects."""
+        if self.how_to_drawn:
+            return []
+        self.how_to_drawn = True
+        howto = resources.get_image(res.IMG_HOW_TO)
         self.screen.blit(howto, (0, 0))
+        return [self.screen.get_rect()]
+
+    def invalidate(self):
+        """Makes the menus draw themselves completely on the next frame, used when the game state changed."""
+        for menu in (self.main_menu, self.pause_menu, self.settings_menu):
+            if menu is not None:
+                menu.invalidate()
+        self.how_to_drawn = False
 
     def init_main_menu_surface(self):
-        """Initializes the surface for the main menu, drawing the title and creating the buttons."""
+        """Initializes the main menu, rendering the title and creating the buttons."""
         if self.level == 0:
             self.level = self.max_level = self.game_data.get_max_level()
-        self.main_menu_surface = pygame.Surface(self.screen_dimensions)
-        self.pause_menu_surface = None
-        self.settings_menu_surface = None
-        self.main_menu_surface.fill(black)
-        self.buttons = []
+        self.main_menu = Menu(self.screen, text_helper.create_text("Indefinite Loop", menu_fonts, 50, white),
+                              hide_disabled=True)
+        self.buttons = self.main_menu.buttons
         self.level_buttons = []
         level_button = TextButton((0, 450), "Level " + str(self.level), menu_fonts, 30, white, white, lambda: None)
         level_button.center_horizontally(self.screen_dimensions)
         self.level_buttons.append(level_button)
         self.buttons.append(level_button)
-        level_down_button = ImageButton(left_of(img_arrow_left, level_button, 20),
-                                        img_arrow_left, img_arrow_left_hover, self.level_down, False)
+        img_arrow_left = scale_image_button(res.IMG_ARROW_RIGHT, True)
+        level_down_button = ImageButton(left_of(img_arrow_left, level_button, LEVEL_ARROW_DISTANCE), img_arrow_left,
+                                        scale_image_button(res.IMG_ARROW_RIGHT_HOVER, True), self.level_down, False)
         self.level_buttons.append(level_down_button)
         self.buttons.append(level_down_button)
-        level_up_button = ImageButton(right_of(img_arrow_right, level_button, 20),
-                                      img_arrow_right, img_arrow_right_hover, self.level_up, False)
+        img_arrow_right = scale_image_button(res.IMG_ARROW_RIGHT)
+        level_up_button = ImageButton(right_of(img_arrow_right, level_button, LEVEL_ARROW_DISTANCE), img_arrow_right,
+                                      scale_image_button(res.IMG_ARROW_RIGHT_HOVER), self.level_up, False)
         self.level_buttons.append(level_up_button)
         self.update_level_buttons()
         self.buttons.append(level_up_button)
@@ -162,13 +157,9 @@ class GUI:
         self.buttons.append(quit_button)
 
     def init_pause_menu(self):
-        """Initializes the pause menu."""
-        self.pause_menu_surface = pygame.Surface(self.screen_dimensions)
-        self.pause_menu_surface.set_alpha(240)
-        self.pause_menu_surface.fill(black)
-        self.main_menu_surface = None
-        self.settings_menu_surface = None
-        self.buttons = []
+        """Initializes the pause menu, which is drawn over the game screen."""
+        self.pause_menu = Menu(self.screen, text_helper.create_text("Pause", menu_fonts, 50, white), overlay=True)
+        self.buttons = self.pause_menu.buttons
         continue_button = TextButton((0, 450), "Continue", menu_fonts, 30, white, red,
                                      lambda: pygame.event.post(pygame.event.Event(events.EXIT_PAUSE, {})))
         continue_button.center_horizontally(self.screen_dimensions)
@@ -182,10 +173,8 @@ class GUI:
 
     def init_settings_menu(self):
         """Initializes the settings menu."""
-        self.settings_menu_surface = pygame.Surface(self.screen_dimensions)
-        self.main_menu_surface = None
-        self.pause_menu_surface = None
-        self.buttons = []
+        self.settings_menu = Menu(self.screen, text_helper.create_text("Settings", menu_fonts, 50, white))
+        self.buttons = self.settings_menu.buttons
         self.settings_buttons = []
         style_button = TextButton((0, 450), get_style_name(self.game_data.get_style()), menu_fonts, 30, white, red,
                                   self.switch_style)
@@ -213,11 +202,6 @@ class GUI:
         quit_button.center_horizontally(self.screen_dimensions)
         return quit_button
 
-    def draw_title(self):
-        """Draws the title onto the screen"""
-        title = text_helper.create_text("Indefinite Loop", menu_fonts, 50, white)
-        self.main_menu_surface.blit(title, (center_horizontally(title, self.screen_dimensions), 50))
-
     def check_button_hover(self, mouse_pos):
         """Notifies the GUI that the mouse has been moved and re-checks
         whether a button is currently being hovered over.
@@ -249,8 +233,13 @@ class GUI:
             self.update_level_buttons()
 
     def update_level_buttons(self):
-        """Updates the text of the level button to match the level set and disables/enables the arrows if needed."""
-        self.level_buttons[0].set_text("Level " + str(self.level))
+        """Updates the text of the level button to match the level set and disables/enables the arrows if needed.
+        The arrows are moved next to the text again, since its width changes with the level."""
+        level_button, level_down_button, level_up_button = self.level_buttons
+        level_button.set_text("Level " + str(self.level))
+        level_down_button.position = left_of(level_down_button.get_rendered_button(), level_button,
+                                             LEVEL_ARROW_DISTANCE)
+        level_up_button.position = right_of(level_up_button.get_rendered_button(), level_button, LEVEL_ARROW_DISTANCE)
         if self.level <= 1:
             self.level_buttons[1].disable()
         else:
@@ -275,19 +264,19 @@ class GUI:
 
     def get_music_button_img(self):
         """Gets the music button image that corresponds to the current setting"""
-        return music_button_images[self.game_data.is_music_on()][False]
+        return scale_image_button(music_button_images[self.game_data.is_music_on()][False])
 
     def get_music_button_img_h(self):
         """Gets the hovered music button image that corresponds to the current setting."""
-        return music_button_images[self.game_data.is_music_on()][True]
+        return scale_image_button(music_button_images[self.game_data.is_music_on()][True])
 
     def get_sound_button_img(self):
         """Gets the sound button image that corresponds to the current setting"""
-        return sound_button_images[self.game_data.is_sound_on()][False]
+        return scale_image_button(sound_button_images[self.game_data.is_sound_on()][False])
 
     def get_sound_button_img_h(self):
         """Gets the hovered sound button image that corresponds to the current setting."""
-        return sound_button_images[self.game_data.is_sound_on()][True]
+        return scale_image_button(sound_button_images[self.game_data.is_sound_on()][True])
 
     def toggle_music(self):
         """Toggles the music setting (sets it to off if it's on, sets it to on if it's off)"""
@@ -0,0 +1,110 @@
+"""Contains the hint engine, which looks for a tile that is provably rotated wrong on a background thread,
+so that the game keeps running smoothly while it searches, even on the biggest maps.
+It first narrows down what every tile can become using the propagation of the solver. A tile whose current rotation
+was ruled out is wrong, and if only one rotation is left for it, that is the rotation it must take.
+If propagation alone doesn't rule out any current rotation, the engine keeps the current rotation of one undecided tile
+after the other and searches for a solution. If there is none, that tile is wrong.
+A search is cancelled right away when the board changes, since its result would be outdated.
+The chunks of a chunked level that weren't generated yet are generated on the background worker as well,
+before the search starts, and handed back together with the hint."""
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event
+import numpy as np
+from solver import Solver, get_domains, narrow, popcount, tile_of
+from chunked_level import complete_level_map
+
+
+class HintEngine:
+    """Finds hints for level maps on a background worker, one at a time."""
+    def __init__(self):
+        """Initializes a new hint engine without a running search."""
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="hint")
+        self.future = None
+        self.cancel_event = Event()
+
+    def request(self, level_map, chunks=None):
+        """Starts looking for a hint for the given level map in the background, cancelling the last search.
+        Takes the chunked level the level map belongs to, if it is one, whose missing chunks are generated first.
+        :type level_map: ndarray
+        :type chunks: ChunkedLevel"""
+        self.cancel()
+        self.cancel_event = Event()
+        if chunks is None:
+            self.future = self.executor.submit(complete_and_find_hint, level_map.copy(), None, None, [],
+                                               self.cancel_event)
+        else:
+            self.future = self.executor.submit(complete_and_find_hint, level_map.copy(), chunks.level, chunks.deltas,
+                                               chunks.get_missing_chunks(), self.cancel_event)
+
+    def cancel(self):
+        """Cancels the running search, if any. Its result is dropped."""
+        self.cancel_event.set()
+        self.future = None
+
+    def is_pending(self):
+        """Returns True if a search was started and its result wasn't taken yet."""
+        return self.future is not None
+
+    def get_result(self):
+        """Returns the result of the search if it is done, taking it, so the next call returns None again.
+        The result is a tuple of the hint and the chunks that were generated for it, see complete_and_find_hint.
+        Returns None while the search is still running."""
+        if self.future is None or not self.future.done():
+            return None
+        future = self.future
+        self.future = None
+        return future.result()
+
+    def close(self):
+        """Cancels the running search and stops the background worker."""
+        self.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def complete_and_find_hint(level_map, level, deltas, chunks, cancel=None):
+    """Generates the given missing chunks of the chunked level with the given number into the level map,
+    rotated by the given number of steps for their cells, since the whole map is needed to prove a tile wrong.
+    Then looks for a hint. Returns a tuple of the hint (see find_hint) and the generated chunks with their tiles.
+    :type level_map: ndarray
+    :type level: int
+    :type deltas: ndarray
+    :type chunks: list
+    :type cancel: threading.Event"""
+    generated = complete_level_map(level, level_map, deltas, chunks, cancel)
+    return find_hint(level_map, cancel), generated
+
+
+def find_hint(level_map, cancel=None):
+    """Looks for a tile of the given level map whose current rotation is provably wrong.
+    Returns a tuple of its cell and the tile it must become, which is None if only the current rotation is known
+    to be wrong. Returns None if there is no such tile or the given cancel event was set.
+    :type level_map: ndarray
+    :type cancel: threading.Event"""
+    solver = Solver(level_map, cancel)
+    domains = get_domains(level_map)
+    if not solver.propagate(domains):
+        return None
+    current = np.uint16(1) << level_map
+    wrong = (domains & current) == 0
+    if wrong.any():
+        # Prefer a tile that has only a single rotation left, since the hint can tell the player which one it is
+        decided = wrong & (popcount[domains] == 1)
+        cell = tuple(int(i) for i in np.argwhere(decided if decided.any() else wrong)[0])
+        return cell, tile_of.get(int(domains[cell]))
+    # Tiles that don't fit to their current neighbours are tried first, since they are the most likely to be wrong
+    candidates = popcount[domains] > 1
+    mismatched = narrow(current) == 0
+    for cell in np.concatenate((np.argwhere(candidates & mismatched), np.argwhere(candidates & ~mismatched))):
+        cell = tuple(int(i) for i in cell)
+        if not candidates[cell]:
+            continue
+        keeping = domains.copy()
+        keeping[cell] = current[cell]
+        solution = solver.search(keeping)
+        if solution is None:
+            if solver.is_cancelled():
+                return None
+            return cell, None
+        # Every tile that has its current rotation in this solution can't be proven wrong anymore
+        candidates &= solution != current
+    return None
@@ -28,3 +28,4 @@ class ImageButton(Button):
         """Sets the images for this button to the given images."""
         self.image = image
         self.image_hovered = image_hovered
+        self.update()
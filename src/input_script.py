@@ -0,0 +1,104 @@
+"""Contains the input script, a timed sequence of clicks, key presses and other events that is fed into the game
+instead of (or in addition to) the input of a user. Used to drive the whole game automatically,
+for example in a headless run for tests and benchmarks.
+Times are given in milliseconds of game time since the game loop started."""
+import bisect
+import pygame
+
+
+class InputScript:
+    """A timed sequence of events, posted to the pygame event queue by the control unit once they are due."""
+    def __init__(self):
+        """Initializes a new empty input script."""
+        self.entries = []  # type: list[tuple[int, int, pygame.event.Event]]
+        self.position = 0
+
+    def add(self, time, event):
+        """Adds the given event to the script, to be posted at the given time.
+        Events with the same time are posted in the order they were added.
+        :type time: int
+        :type event: pygame.event.Event"""
+        # The sequence number is unique, so the events themselves are never compared
+        bisect.insort(self.entries, (time, len(self.entries), event))
+        return self
+
+    def post(self, time, event_type, **attributes):
+        """Adds an event of the given type with the given attributes, for example a state event like
+        events.START_GAME_MODE_0 with a level.
+        :type time: int
+        :type event_type: int"""
+        return self.add(time, pygame.event.Event(event_type, **attributes))
+
+    def move(self, time, pos):
+        """Adds a mouse movement to the given position, which makes the menus check their button hover.
+        :type time: int
+        :type pos: tuple"""
+        return self.post(time, pygame.MOUSEMOTION, pos=pos, rel=(0, 0), buttons=(0, 0, 0))
+
+    def click(self, time, pos, button=1, mod=0):
+        """Adds a click at the given position, meaning a mouse movement there, a button press and a button release.
+        The modifier keys held while clicking are given like the ones of a key press, for example pygame.KMOD_SHIFT.
+        :type time: int
+        :type pos: tuple
+        :type button: int
+        :type mod: int"""
+        self.move(time, pos)
+        self.post(time, pygame.MOUSEBUTTONDOWN, pos=pos, button=button, mod=mod)
+        return self.post(time, pygame.MOUSEBUTTONUP, pos=pos, button=button, mod=mod)
+
+    def key(self, time, key, mod=0):
+        """Adds a key press and release of the given key with the given modifiers.
+        :type time: int
+        :type key: int
+        :type mod: int"""
+        self.post(time, pygame.KEYDOWN, key=key, mod=mod, unicode="", scancode=0)
+        return self.post(time, pygame.KEYUP, key=key, mod=mod, unicode="", scancode=0)
+
+    def hold(self, time, key, duration):
+        """Adds a key press of the given key that is released after the given duration.
+        :type time: int
+        :type key: int
+        :type duration: int"""
+        self.post(time, pygame.KEYDOWN, key=key, mod=0, unicode="", scancode=0)
+        return self.post(time + duration, pygame.KEYUP, key=key, mod=0, unicode="", scancode=0)
+
+    def drag(self, time, start, end, button=2):
+        """Adds a drag with the given mouse button from the start to the end position, as a single movement.
+        :type time: int
+        :type start: tuple
+        :type end: tuple
+        :type button: int"""
+        self.move(time, start)
+        self.post(time, pygame.MOUSEBUTTONDOWN, pos=start, button=button)
+        self.post(time, pygame.MOUSEMOTION, pos=end, rel=(end[0] - start[0], end[1] - start[1]), buttons=(0, 1, 0))
+        return self.post(time, pygame.MOUSEBUTTONUP, pos=end, button=button)
+
+    def wheel(self, time, pos, steps):
+        """Adds a turn of the mouse wheel by the given number of steps with the mouse at the given position.
+        :type time: int
+        :type pos: tuple
+        :type steps: int"""
+        self.move(time, pos)
+        return self.post(time, pygame.MOUSEWHEEL, pos=pos, x=0, y=steps, flipped=False)
+
+    def quit(self, time):
+        """Adds a quit event, which ends the game loop.
+        :type time: int"""
+        return self.post(time, pygame.QUIT)
+
+    def get_due_events(self, now):
+        """Returns the events that are due at the given time and haven't been returned yet.
+        :type now: int"""
+        due = []
+        while self.position < len(self.entries) and self.entries[self.position][0] <= now:
+            due.append(self.entries[self.position][2])
+            self.position += 1
+        return due
+
+    def is_finished(self):
+        """Returns True if all events of the script have been returned."""
+        return self.position >= len(self.entries)
+
+    def reset(self):
+        """Starts the script from the beginning again."""
+        self.position = 0
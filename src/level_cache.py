@@ -0,0 +1,147 @@
+"""Contains the level cache, which keeps generated levels in memory and generates upcoming levels in the background.
+Since the levels only depend on their number, the next level can be generated while the current one is being played,
+so that advancing to it doesn't have to wait for the level generator.
+If a level store is given, levels are loaded from the level pack on the disk instead of being generated again."""
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from level_generator import generate_level
+
+
+CACHE_SIZE = 4  # the number of levels kept in memory
+
+
+class LevelCache:
+    """A small in-memory cache of generated levels with a background worker to prefetch levels."""
+    def __init__(self, store=None, size=CACHE_SIZE):
+        """Initializes a new level cache that keeps at most the given number of levels.
+        Takes the level store to load levels from and save generated levels to, if any.
+        :type store: LevelStore
+        :type size: int"""
+        self.store = store
+        self.size = size
+        self.levels = OrderedDict()
+        self.pending = {}
+        self.prefetched = set()
+        self.lock = Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="level-prefetch")
+        self.hits = 0
+        self.prefetch_hits = 0
+        self.misses = 0
+        self.loaded = 0
+        self.generated = 0
+        self.generation_time = 0.0
+        self.last_generation_time = 0.0
+
+    def get(self, level):
+        """Returns the level map for the given level number. Takes it from the cache if possible,
+        waits for the background worker if the level is currently being prefetched and generates it otherwise.
+        If prefetching the level failed, it is generated right away instead.
+        Returns a copy, so the caller may change it freely.
+        :type level: int"""
+        with self.lock:
+            if level in self.levels:
+                self.hits += 1
+                if level in self.prefetched:
+                    self.prefetched.discard(level)
+                    self.prefetch_hits += 1
+                self.levels.move_to_end(level)
+                return self.levels[level].copy()
+            future = self.pending.get(level)
+        if future is not None and future.exception() is None:
+            level_map = future.result()
+            with self.lock:
+                self.prefetched.discard(level)
+                self.prefetch_hits += 1
+                self.hits += 1
+            return level_map.copy()
+        with self.lock:
+            self.misses += 1
+        if future is not None:
+            level_map = self.generate(level)
+        else:
+            level_map = self.load_or_generate(level)
+        with self.lock:
+            self.add(level, level_map)
+        return level_map.copy()
+
+    def prefetch(self, level):
+        """Starts generating the given level in the background, unless it is already cached or being generated.
+        :type level: int"""
+        with self.lock:
+            if level in self.levels or level in self.pending:
+                return
+            self.pending[level] = self.executor.submit(self.prefetch_level, level)
+
+    def prefetch_level(self, level):
+        """Generates the given level and stores it in the cache. Runs on the background worker.
+        The level is no longer pending afterwards, even if generating it failed, so it can be prefetched again.
+        :type level: int"""
+        level_map = None
+        try:
+            level_map = self.load_or_generate(level)
+        finally:
+            with self.lock:
+                del self.pending[level]
+                if level_map is not None:
+                    self.add(level, level_map)
+                    self.prefetched.add(level)
+        return level_map
+
+    def load_or_generate(self, level):
+        """Loads the given level from the level store if it's stored there.
+        Otherwise generates it and saves it to the level store.
+        :type level: int"""
+        if self.store is not None:
+            level_map = self.store.load(level)
+            if level_map is not None:
+                with self.lock:
+                    self.loaded += 1
+                return level_map
+        level_map = self.generate(level)
+        if self.store is not None:
+            self.store.save(level, level_map)
+        return level_map
+
+    def generate(self, level):
+        """Generates the given level, keeping track of the time the generation took.
+        :type level: int"""
+        start = time.perf_counter()
+        level_map = generate_level(level)
+        duration = time.perf_counter() - start
+        with self.lock:
+            self.generated += 1
+            self.generation_time += duration
+            self.last_generation_time = duration
+        return level_map
+
+    def add(self, level, level_map):
+        """Stores a level in the cache and evicts the least recently used levels if the cache is full.
+        Must be called while holding the lock.
+        :type level: int
+        :type level_map: ndarray"""
+        self.levels[level] = level_map
+        self.levels.move_to_end(level)
+        while len(self.levels) > self.size:
+            evicted, _ = self.levels.popitem(last=False)
+            self.prefetched.discard(evicted)
+
+    def get_stats(self):
+        """Returns the statistics of the cache as a dictionary, used for monitoring."""
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "prefetch_hits": self.prefetch_hits,
+                "misses": self.misses,
+                "loaded": self.loaded,
+                "generated": self.generated,
+                "generation_time": self.generation_time,
+                "last_generation_time": self.last_generation_time,
+                "cached": len(self.levels),
+                "pending": len(self.pending)
+            }
+
+    def close(self):
+        """Stops the background worker. Levels that are still being prefetched are dropped."""
+        self.executor.shutdown(wait=False, cancel_futures=True)
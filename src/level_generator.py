@@ -2,82 +2,325 @@
 to ensure that the levels are the same for everyone.
 Every tile is represented by a number in the following fashion:
 5 = 0b0101, with each bit representing whether or not there is a collection in the respective direction.
-The first bit (starting from the right!) is for left, the second for up, the third for right and the fourth for down."""
+The first bit (starting from the right!) is for left, the second for up, the third for right and the fourth for down.
+There are three versions of the generator. Version 1 is the original tile-by-tile generator, version 2 decides
+every connection between two neighbouring tiles at once using numpy, which is a lot faster on big maps.
+Version 3 does the same, but splits the map into chunks of CHUNK_SIZE x CHUNK_SIZE tiles. Every chunk gets its own
+random generator, seeded by the level number and the position of the chunk, which decides the connections within
+the chunk and the rotations of its tiles. The connections on the seam between two chunks are decided by a random
+generator seeded by that pair of chunks. So every chunk can be generated on its own, only when it's needed,
+and a whole map generated chunk by chunk is exactly the same as one generated at once.
+All versions result in the same distribution of levels, but not in the same levels for a given level number.
+Every generation uses its own random generator, so levels can be generated in several threads or processes at once.
+Level maps are arrays of one byte per tile (TILE_DTYPE). For storing and sharing them, they can be packed
+into half a byte per tile, two tiles per byte (see pack_tiles)."""
 from src.utility import is_kth_bit_set
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import os
 import random
 import numpy as np
 
 
-def generate_level(level):
-    """Generates the level with the given number.
+GENERATOR_VERSION = 3   # the generator version used by the game, see generate_level
+CHUNK_SIZE = 32  # the width and height of a chunk of a map generated by version 3
+TILE_DTYPE = np.uint8  # the type of the tiles in a level map
+
+LEFT = 0b0001
+UP = 0b0010
+RIGHT = 0b0100
+DOWN = 0b1000
+
+
+def generate_level(level, version=GENERATOR_VERSION):
+    """Generates the level with the given number, using the given version of the generator.
     Returns it as a 2d numpy array containing the tiles represented as explained above.
     This method could be tested by giving it a random number and checking whether the returned array is a valid level
     with a valid solution.
+    :type level: int
+    :type version: int"""
+    if version == 1:
+        return generate_level_v1(level)
+    if version == 2:
+        return generate_level_v2(level)
+    if version == 3:
+        return generate_level_v3(level)
+    raise ValueError("Unknown generator version: " + str(version))
+
+
+def generate_levels(levels, workers=None, version=GENERATOR_VERSION):
+    """Generates all the given levels, spread over a pool of worker processes. Yields the levels in the given order.
+    Uses as many workers as there are CPUs if no number of workers is given, and no pool at all for a single worker.
+    :type levels: iterable
+    :type workers: int
+    :type version: int"""
+    levels = list(levels)
+    workers = workers or os.cpu_count() or 1
+    generate = partial(generate_level, version=version)
+    if workers == 1 or len(levels) <= 1:
+        yield from map(generate, levels)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # A single level is generated quickly, so hand out the levels in chunks to keep the overhead low
+        yield from pool.map(generate, levels, chunksize=max(1, len(levels) // (workers * 4)))
+
+
+def get_seed(level):
+    """Returns the seed used for generating the level with the given number.
     :type level: int"""
-    seed = level * 69420   # multiply by 69420 to not have the seeds too close to each other
-    random.seed(seed)
+    return level * 69420   # multiply by 69420 to not have the seeds too close to each other
+
+
+def generate_level_v1(level):
+    """Generates the level with the given number tile by tile, the way the game always did.
+    Picks a random unset tile, connects it to its already set neighbours and randomly decides on the connections
+    to its unset neighbours.
+    :type level: int"""
+    rng = random.Random(get_seed(level))
     dimensions = get_map_size(level)
     level_map = np.full(dimensions, -1)
-    while -1 in level_map:
-        choice = random.choice(np.argwhere(level_map == -1))
-        next_index = (choice[0], choice[1])
+    # The unset indices in the same order as np.argwhere(level_map == -1) would return them,
+    # so that random.choice picks the same tiles as before without scanning the whole map for every tile.
+    unset = [(x, y) for x in range(dimensions[0]) for y in range(dimensions[1])]
+    while unset:
+        next_index = rng.choice(unset)
+        unset.remove(next_index)
         # get indices of the tiles next to the current index
         left_index, up_index, right_index, down_index = get_direction_indices(next_index)
-        left = tile_needs_connection(left_index, level_map, has_connection_right)
-        up = tile_needs_connection(up_index, level_map, has_connection_down)
-        right = tile_needs_connection(right_index, level_map, has_connection_left)
-        down = tile_needs_connection(down_index, level_map, has_connection_up)
+        left = tile_needs_connection(left_index, level_map, has_connection_right, rng)
+        up = tile_needs_connection(up_index, level_map, has_connection_down, rng)
+        right = tile_needs_connection(right_index, level_map, has_connection_left, rng)
+        down = tile_needs_connection(down_index, level_map, has_connection_up, rng)
         level_map[next_index] = get_tile(left, up, right, down)
-    return un_solve(level_map)
+    return un_solve(level_map, rng).astype(TILE_DTYPE)
+
+
+def generate_level_v2(level):
+    """Generates the level with the given number by deciding on all connections at once.
+    Every connection between two neighbouring tiles is set with a probability of one half,
+    just like in version 1, where the tile that is set first decides randomly.
+    :type level: int"""
+    rng = np.random.default_rng(get_seed(level))
+    width, height = get_map_size(level)
+    # horizontal[x, y] connects (x, y) with (x + 1, y), vertical[x, y] connects (x, y) with (x, y + 1)
+    horizontal = rng.integers(0, 2, (width - 1, height), dtype=bool)
+    vertical = rng.integers(0, 2, (width, height - 1), dtype=bool)
+    return un_solve_v2(build_level_map(horizontal, vertical), rng)
+
+
+def generate_level_v3(level):
+    """Generates the level with the given number chunk by chunk, see generate_chunk.
+    :type level: int"""
+    level_map = np.zeros(get_map_size(level), dtype=TILE_DTYPE)
+    width, height = get_chunk_grid_size(level_map.shape)
+    for cx in range(width):
+        for cy in range(height):
+            level_map[get_chunk_slices(level_map.shape, (cx, cy))] = generate_chunk(level, (cx, cy))
+    return level_map
+
 
+def generate_chunk(level, chunk):
+    """Generates the tiles of the given chunk of the level with the given number, already spun, as version 3 does.
+    Only depends on the level number and the position of the chunk, not on any other chunk.
+    The first chunk is spun again until it has a dangling connection within itself or to the border of the map,
+    which makes sure that the whole level isn't solved from the start.
+    :type level: int
+    :type chunk: tuple"""
+    shape = get_map_size(level)
+    xs, ys = get_chunk_slices(shape, chunk)
+    width, height = xs.stop - xs.start, ys.stop - ys.start
+    cx, cy = chunk
+    rng = np.random.default_rng([get_seed(level), 0, cx, cy])
+    horizontal = rng.integers(0, 2, (width - 1, height), dtype=bool)
+    vertical = rng.integers(0, 2, (width, height - 1), dtype=bool)
+    tiles = build_level_map(horizontal, vertical)
+    # The connections on the seams to the neighbouring chunks, the ones on the border of the map are never set
+    if xs.start > 0:
+        tiles[0, :] |= get_seam(level, (cx - 1, cy), 1, height) * TILE_DTYPE(LEFT)
+    if xs.stop < shape[0]:
+        tiles[-1, :] |= get_seam(level, chunk, 1, height) * TILE_DTYPE(RIGHT)
+    if ys.start > 0:
+        tiles[:, 0] |= get_seam(level, (cx, cy - 1), 2, width) * TILE_DTYPE(UP)
+    if ys.stop < shape[1]:
+        tiles[:, -1] |= get_seam(level, chunk, 2, width) * TILE_DTYPE(DOWN)
+    while True:
+        spun = rotations[tiles, rng.integers(0, 4, tiles.shape)]
+        if chunk != (0, 0):
+            return spun
+        # Connections over the seams to the next chunks would count as dangling, but they may fit to those chunks
+        dangling = count_dangling_edges(spun)
+        if xs.stop < shape[0]:
+            dangling -= np.count_nonzero(spun[-1, :] & RIGHT)
+        if ys.stop < shape[1]:
+            dangling -= np.count_nonzero(spun[:, -1] & DOWN)
+        if dangling > 0:
+            return spun
 
-def un_solve(level_map):
-    """Randomly spins all the tiles to make the level unsolved.
+
+def get_seam(level, chunk, direction, length):
+    """Returns the connections on the seam between the given chunk and the next chunk to its right (direction 1)
+    or below it (direction 2), seeded by the given chunk and the direction, so both chunks get the same seam.
+    :type level: int
+    :type chunk: tuple
+    :type direction: int
+    :type length: int"""
+    rng = np.random.default_rng([get_seed(level), direction, chunk[0], chunk[1]])
+    return rng.integers(0, 2, length, dtype=bool)
+
+
+def get_chunk_grid_size(shape):
+    """Returns the number of chunks of a map of the given shape in both directions.
+    :type shape: tuple"""
+    return -(-shape[0] // CHUNK_SIZE), -(-shape[1] // CHUNK_SIZE)
+
+
+def get_chunk_slices(shape, chunk):
+    """Returns the slices of the cells of the given chunk in a map of the given shape.
+    The chunks at the right and bottom border of the map may be smaller than the others.
+    :type shape: tuple
+    :type chunk: tuple"""
+    return slice(chunk[0] * CHUNK_SIZE, min((chunk[0] + 1) * CHUNK_SIZE, shape[0])), \
+        slice(chunk[1] * CHUNK_SIZE, min((chunk[1] + 1) * CHUNK_SIZE, shape[1]))
+
+
+def build_level_map(horizontal, vertical):
+    """Builds a solved level map from the connections between neighbouring tiles.
+    horizontal has the shape (width - 1, height) and tells whether (x, y) is connected to (x + 1, y),
+    vertical has the shape (width, height - 1) and tells whether (x, y) is connected to (x, y + 1).
+    :type horizontal: ndarray
+    :type vertical: ndarray"""
+    level_map = np.zeros((vertical.shape[0], horizontal.shape[1]), dtype=TILE_DTYPE)
+    level_map[:-1, :] |= horizontal * TILE_DTYPE(RIGHT)
+    level_map[1:, :] |= horizontal * TILE_DTYPE(LEFT)
+    level_map[:, :-1] |= vertical * TILE_DTYPE(DOWN)
+    level_map[:, 1:] |= vertical * TILE_DTYPE(UP)
+    return level_map
+
+
+def un_solve(level_map, rng=random):
+    """Randomly spins all the tiles to make the level unsolved. Takes the random generator to be used.
     This method could be tested by giving it a level that is solved,
-    and checking whether the level returned is not solved."""
+    and checking whether the level returned is not solved.
+    :type level_map: ndarray
+    :type rng: random.Random"""
     for x in range(level_map.shape[0]):
         for y in range(level_map.shape[1]):
             i = (x, y)
             if level_map[i] == 0 or level_map[i] == 0b1111:
                 continue    # no need to spin empty tiles or tiles with connections to all sides
-            level_map[i] = rotate_random(level_map[i])
+            level_map[i] = rotate_random(level_map[i], rng)
     if not is_solved(level_map):
         return level_map
     # For this method to be infinitely recursive (which would be bad) there would have to be a level without any tiles,
     # which has a probability of 1/16 to the power of the number of possible tiles in the level, in other words:
     # Near impossible. Near enough to not go the additional length of handling that case.
-    return un_solve(level_map)
+    return un_solve(level_map, rng)
+
+
+def un_solve_v2(level_map, rng):
+    """Randomly spins all the tiles at once to make the level unsolved. Takes the random generator to be used.
+    Spinning empty tiles or tiles with connections to all sides has no effect, so they don't need to be skipped.
+    :type level_map: ndarray
+    :type rng: np.random.Generator"""
+    while True:
+        spun = rotations[level_map, rng.integers(0, 4, level_map.shape)]
+        if not is_solved(spun):
+            return spun
 
 
 def is_solved(level_map):
-    """Returns true if the given level map is solved (meaning there is no more dangling connection)"""
-    shape = level_map.shape
-    for x in range(shape[0]):
-        for y in range(shape[1]):
-            i = (x, y)
-            tile = level_map[i]
-            if tile == 0:
-                continue
-            left_index, up_index, right_index, down_index = get_direction_indices(i)
-            if has_connection_left(tile) and \
-                    (tile_is_out_of_borders(left_index, shape) or not has_connection_right(level_map[left_index])):
-                return False
-            if has_connection_up(tile) and \
-                    (tile_is_out_of_borders(up_index, shape) or not has_connection_down(level_map[up_index])):
-                return False
-            if has_connection_right(tile) and \
-                    (tile_is_out_of_borders(right_index, shape) or not has_connection_left(level_map[right_index])):
-                return False
-            if has_connection_down(tile) and \
-                    (tile_is_out_of_borders(down_index, shape) or not has_connection_up(level_map[down_index])):
-                return False
-    return True
-
-
-def rotate_random(tile):
-    """Rotates a tile either by 0, 90, 180 or 270 degrees. Returns the rotated tile.
-    :type tile: int"""
-    return rotate(tile, random.choice([0, 1, 2, 3]))
+    """Returns true if the given level map is solved (meaning there is no more dangling connection).
+    Also takes a stack of level maps with the shape (N, width, height) and returns an array of N booleans then.
+    :type level_map: ndarray"""
+    return count_dangling_edges(level_map) == 0
+
+
+def check_levels(level_maps):
+    """Checks a stack of level maps with the shape (N, width, height) at once.
+    Returns an array telling which of the maps are solved and an array with the number of dangling connections
+    of every map.
+    :type level_maps: ndarray"""
+    dangling = np.asarray(count_dangling_edges(level_maps))
+    return dangling == 0, dangling
+
+
+def count_dangling_edges(level_map):
+    """Returns the number of dangling connections in the given level map, meaning connections that lead out of the
+    map or to a tile without a matching connection. The level is solved if there are none.
+    Compares the bit planes of the map with the ones of its neighbours shifted by one tile, so every edge is looked at
+    exactly once. Also takes a stack of level maps with the shape (N, width, height)
+    and returns an array of N numbers then.
+    :type level_map: ndarray"""
+    level_map = np.asarray(level_map)
+    left = (level_map & LEFT) != 0
+    up = (level_map & UP) != 0
+    right = (level_map & RIGHT) != 0
+    down = (level_map & DOWN) != 0
+    axes = (-2, -1)
+    count = np.count_nonzero(right[..., :-1, :] != left[..., 1:, :], axis=axes) + \
+        np.count_nonzero(down[..., :, :-1] != up[..., :, 1:], axis=axes) + \
+        np.count_nonzero(left[..., 0, :], axis=-1) + np.count_nonzero(right[..., -1, :], axis=-1) + \
+        np.count_nonzero(up[..., :, 0], axis=-1) + np.count_nonzero(down[..., :, -1], axis=-1)
+    if level_map.ndim == 2:
+        return int(count)
+    return count
+
+
+def get_dangling_cells(level_map):
+    """Returns a boolean array of the shape of the given level map telling which tiles have a dangling connection,
+    or are next to a tile with a dangling connection to them.
+    :type level_map: ndarray"""
+    level_map = np.asarray(level_map)
+    left = (level_map & LEFT) != 0
+    up = (level_map & UP) != 0
+    right = (level_map & RIGHT) != 0
+    down = (level_map & DOWN) != 0
+    dangling = np.zeros(level_map.shape, dtype=bool)
+    horizontal = right[:-1, :] != left[1:, :]
+    dangling[:-1, :] |= horizontal
+    dangling[1:, :] |= horizontal
+    vertical = down[:, :-1] != up[:, 1:]
+    dangling[:, :-1] |= vertical
+    dangling[:, 1:] |= vertical
+    dangling[0, :] |= left[0, :]
+    dangling[-1, :] |= right[-1, :]
+    dangling[:, 0] |= up[:, 0]
+    dangling[:, -1] |= down[:, -1]
+    return dangling
+
+
+def count_dangling_edges_at(level_map, index):
+    """Returns the number of dangling connections on the four sides of the tile at the given index.
+    Used to keep track of the dangling connections of a map when a single tile is rotated.
+    :type level_map: ndarray
+    :type index: tuple"""
+    left_index, up_index, right_index, down_index = get_direction_indices(index)
+    return edge_is_dangling(level_map, index, left_index, has_connection_left, has_connection_right) + \
+        edge_is_dangling(level_map, index, up_index, has_connection_up, has_connection_down) + \
+        edge_is_dangling(level_map, index, right_index, has_connection_right, has_connection_left) + \
+        edge_is_dangling(level_map, index, down_index, has_connection_down, has_connection_up)
+
+
+def edge_is_dangling(level_map, index, neighbour_index, has_connection, neighbour_has_connection):
+    """Returns 1 if the edge between the tile at index and the one at neighbour_index is dangling, 0 if not.
+    An edge is dangling if exactly one of the two tiles has a connection there.
+    Neighbours out of the borders never have a connection.
+    :type level_map: ndarray
+    :type index: tuple
+    :type neighbour_index: tuple
+    :type has_connection: function
+    :type neighbour_has_connection: function"""
+    connected = has_connection(level_map[index])
+    if tile_is_out_of_borders(neighbour_index, level_map.shape):
+        return int(connected)
+    return int(connected != neighbour_has_connection(level_map[neighbour_index]))
+
+
+def rotate_random(tile, rng=random):
+    """Rotates a tile either by 0, 90, 180 or 270 degrees, using the given random generator. Returns the rotated tile.
+    :type tile: int
+    :type rng: random.Random"""
+    return rotate(tile, rng.choice([0, 1, 2, 3]))
 
 
 def rotate(tile, n):
@@ -87,6 +330,53 @@ def rotate(tile, n):
     return 0b1111 & (tile << n | tile >> (4 - n))
 
 
+# Use like this: rotations[tile, n] is the tile rotated by n steps clockwise. Works on whole arrays as well.
+rotations = np.array([[rotate(tile, n) for n in range(4)] for tile in range(16)], dtype=TILE_DTYPE)
+
+
+def get_rotation_deltas(level_map, rotated):
+    """Returns the number of steps every tile of the given level map was rotated by clockwise to get the given
+    rotated level map, which must consist of the same tiles rotated. Tiles that look the same after different numbers
+    of steps get the smallest one.
+    :type level_map: ndarray
+    :type rotated: ndarray"""
+    return np.argmax(rotations[level_map] == rotated[..., np.newaxis], axis=-1).astype(TILE_DTYPE)
+
+
+def apply_rotation_deltas(level_map, deltas):
+    """Returns the given level map with every tile rotated clockwise by the given number of steps for its cell.
+    :type level_map: ndarray
+    :type deltas: ndarray"""
+    return rotations[level_map, deltas]
+
+
+def pack_tiles(level_map):
+    """Packs the tiles of the given level map into two tiles per byte, the first tile of each pair in the lower half.
+    Returns a flat array of bytes, whose last byte only holds one tile if the number of tiles is odd.
+    :type level_map: ndarray"""
+    tiles = np.asarray(level_map, dtype=TILE_DTYPE).ravel()
+    if len(tiles) % 2 == 1:
+        tiles = np.append(tiles, TILE_DTYPE(0))
+    return tiles[0::2] | (tiles[1::2] << 4)
+
+
+def unpack_tiles(packed, shape):
+    """Unpacks tiles packed by pack_tiles into a level map of the given shape.
+    :type packed: ndarray
+    :type shape: tuple"""
+    packed = np.asarray(packed, dtype=TILE_DTYPE)
+    tiles = np.empty(len(packed) * 2, dtype=TILE_DTYPE)
+    tiles[0::2] = packed & 0b1111
+    tiles[1::2] = packed >> 4
+    return tiles[:shape[0] * shape[1]].reshape(shape)
+
+
+def get_packed_size(shape):
+    """Returns the number of bytes the tiles of a level map of the given shape take when packed.
+    :type shape: tuple"""
+    return (shape[0] * shape[1] + 1) // 2
+
+
 def get_tile(left, up, right, down):
     """Returns the numeric value for the tile, determined by whether or not it has connections in given directions.
     :type left: int
@@ -105,18 +395,20 @@ def get_tile(left, up, right, down):
     return tile
 
 
-def tile_needs_connection(index, level_map, adjacent_has_connection):
+def tile_needs_connection(index, level_map, adjacent_has_connection, rng=random):
     """Returns True if the tile needs a connection to the given index, False if it must not have one.
     If neither is the case, returns a random value of either True or False.
-    Takes the index, the map, and the function in which direction to check for an existing connection.
+    Takes the index, the map, the function in which direction to check for an existing connection
+    and the random generator to be used.
     :type index: tuple
     :type level_map: ndarray
-    :type adjacent_has_connection: function"""
+    :type adjacent_has_connection: function
+    :type rng: random.Random"""
     if tile_is_out_of_borders(index, level_map.shape):
         return False
     if tile_is_set(index, level_map):
         return adjacent_has_connection(level_map[index])
-    return random.choice([True, False])
+    return rng.choice([True, False])
 
 
 def tile_is_out_of_borders(index, shape):
@@ -150,7 +442,13 @@ def get_map_size(level):
         return 10, 10
     if level < 150:
         return 25, 25
-    return 50, 50
+    if level < 500:
+        return 50, 50
+    if level < 700:
+        return 200, 200
+    if level < 900:
+        return 500, 500
+    return 1000, 1000
 
 
 def has_connection_left(tile):
@@ -0,0 +1,181 @@
+"""Contains the level store, which keeps generated levels in an indexed file on the disk, the level pack.
+The level pack is read through a numpy memmap, so loading any level takes the same short time
+and no level has to be generated twice, not even across sessions.
+The pack starts with a header (magic bytes, pack format, generator version and the number of index slots),
+followed by one index entry per level (offset, width and height of the level) and the tiles of all stored levels,
+packed two tiles per byte (see pack_tiles in level_generator.py).
+A pack written in another format or by another generator version is stale and will be rebuilt.
+A stored level whose size doesn't match the map size of its level number anymore counts as not stored
+and is written again when it was generated with the current size. So does a level whose tiles are cut off,
+because the pack was truncated."""
+import os
+from threading import Lock
+import numpy as np
+from level_generator import GENERATOR_VERSION, generate_levels, get_map_size, pack_tiles, unpack_tiles, \
+    get_packed_size
+
+
+MAGIC = b"ILPK"
+PACK_FORMAT = 2
+DEFAULT_CAPACITY = 1024  # the number of index slots in a new pack, grows if a level with a higher number is stored
+
+header_dtype = np.dtype([("magic", "S4"), ("format", "<u4"), ("generator_version", "<u4"), ("capacity", "<u4")])
+index_dtype = np.dtype([("offset", "<u8"), ("width", "<u2"), ("height", "<u2"), ("reserved", "<u4")])
+
+
+class LevelStore:
+    """Stores generated levels in a level pack on the disk and loads them from there."""
+    def __init__(self, path, capacity=DEFAULT_CAPACITY):
+        """Initializes a new level store using the level pack at the given path.
+        If there is no pack yet, or the pack is stale or broken, a new empty one will be created.
+        :type path: str
+        :type capacity: int"""
+        self.path = path
+        self.lock = Lock()
+        self.data = None
+        self.capacity = capacity
+        if not self.is_valid_pack():
+            self.create(capacity, [])
+
+    def is_valid_pack(self):
+        """Returns True if the file at the path of this store is a level pack of the current format and generator,
+        with at least one index slot. Takes over the number of index slots of the pack if it is valid."""
+        try:
+            with open(self.path, 'rb') as f:
+                header = np.frombuffer(f.read(header_dtype.itemsize), dtype=header_dtype)
+        except IOError:
+            return False
+        if len(header) != 1 or header[0]["magic"] != MAGIC or header[0]["format"] != PACK_FORMAT or \
+                header[0]["generator_version"] != GENERATOR_VERSION or header[0]["capacity"] == 0:
+            return False
+        self.capacity = int(header[0]["capacity"])
+        return os.path.getsize(self.path) >= get_data_start(self.capacity)
+
+    def create(self, capacity, levels):
+        """Writes a new level pack with the given number of index slots, containing the given levels.
+        :type capacity: int
+        :type levels: list"""
+        self.data = None
+        header = np.array([(MAGIC, PACK_FORMAT, GENERATOR_VERSION, capacity)], dtype=header_dtype)
+        index = np.zeros(capacity, dtype=index_dtype)
+        offset = get_data_start(capacity)
+        for level, level_map in levels:
+            index[level - 1] = (offset, level_map.shape[0], level_map.shape[1], 0)
+            offset += get_packed_size(level_map.shape)
+        with open(self.path, 'wb') as f:
+            f.write(header.tobytes())
+            f.write(index.tobytes())
+            for _, level_map in levels:
+                f.write(pack_tiles(level_map).tobytes())
+        self.capacity = capacity
+
+    def get_data(self):
+        """Returns the memmap of the whole level pack, opening it if necessary."""
+        if self.data is None:
+            self.data = np.memmap(self.path, dtype=np.uint8, mode='r')
+        return self.data
+
+    def get_index(self):
+        """Returns the index of the level pack, read from the memmap."""
+        data = self.get_data()
+        start = header_dtype.itemsize
+        return data[start:start + self.capacity * index_dtype.itemsize].view(index_dtype)
+
+    def contains(self, level):
+        """Returns True if the given level is stored in the level pack.
+        :type level: int"""
+        with self.lock:
+            return 0 < level <= self.capacity and self.is_stored(self.get_index()[level - 1], level)
+
+    def load(self, level):
+        """Loads the given level from the level pack. Returns None if it isn't stored.
+        :type level: int"""
+        with self.lock:
+            if not 0 < level <= self.capacity:
+                return None
+            entry = self.get_index()[level - 1]
+            if not self.is_stored(entry, level):
+                return None
+            return self.read(entry)
+
+    def is_stored(self, entry, level):
+        """Returns True if the given index entry belongs to a stored level that has the map size of the given level
+        and whose tiles are completely in the level pack. Must be called while holding the lock.
+        :type entry: np.void
+        :type level: int"""
+        return is_stored(entry, level) and self.is_complete(entry)
+
+    def is_complete(self, entry):
+        """Returns True if the tiles of the given index entry are completely in the level pack,
+        which they aren't if the pack was truncated. Must be called while holding the lock.
+        :type entry: np.void"""
+        shape = (int(entry["width"]), int(entry["height"]))
+        return int(entry["offset"]) + get_packed_size(shape) <= len(self.get_data())
+
+    def read(self, entry):
+        """Reads the level of the given index entry from the memmap. Must be called while holding the lock.
+        Returns None if its tiles aren't completely in the level pack.
+        :type entry: np.void"""
+        if not self.is_complete(entry):
+            return None
+        offset = int(entry["offset"])
+        shape = (int(entry["width"]), int(entry["height"]))
+        return unpack_tiles(self.get_data()[offset:offset + get_packed_size(shape)], shape)
+
+    def save(self, level, level_map):
+        """Stores the given level in the level pack. Levels that are already stored are not written again.
+        :type level: int
+        :type level_map: ndarray"""
+        if level < 1:
+            return
+        with self.lock:
+            if level > self.capacity:
+                self.grow(level)
+            elif self.is_stored(self.get_index()[level - 1], level):
+                return
+            self.data = None
+            with open(self.path, 'r+b') as f:
+                f.seek(0, os.SEEK_END)
+                offset = f.tell()
+                f.write(pack_tiles(level_map).tobytes())
+                entry = np.array([(offset, level_map.shape[0], level_map.shape[1], 0)], dtype=index_dtype)
+                f.seek(header_dtype.itemsize + (level - 1) * index_dtype.itemsize)
+                f.write(entry.tobytes())
+
+    def grow(self, level):
+        """Rewrites the level pack with enough index slots for the given level. Must be called while holding the lock.
+        Levels whose tiles are cut off are dropped.
+        :type level: int"""
+        capacity = self.capacity
+        while capacity < level:
+            capacity *= 2
+        index = self.get_index()
+        levels = []
+        for slot in np.flatnonzero(index["offset"]):
+            level_map = self.read(index[slot])
+            if level_map is not None:
+                levels.append((int(slot) + 1, level_map))
+        del index
+        self.create(capacity, levels)
+
+    def build(self, levels, workers=None):
+        """Generates and stores all the given levels that aren't stored yet. Used to fill a new or rebuilt pack.
+        The levels are generated by the given number of worker processes, using all CPUs if no number is given.
+        :type levels: iterable
+        :type workers: int"""
+        missing = [level for level in levels if not self.contains(level)]
+        for level, level_map in zip(missing, generate_levels(missing, workers)):
+            self.save(level, level_map)
+
+
+def get_data_start(capacity):
+    """Returns the offset at which the tiles start in a level pack with the given number of index slots.
+    :type capacity: int"""
+    return header_dtype.itemsize + capacity * index_dtype.itemsize
+
+
+def is_stored(entry, level):
+    """Returns True if the given index entry belongs to a stored level that has the map size of the given level.
+    :type entry: np.void
+    :type level: int"""
+    return entry["offset"] != 0 and (int(entry["width"]), int(entry["height"])) == get_map_size(level)
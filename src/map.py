@@ -1,113 +1,682 @@
 """Contains the Map class that represents the in-game screen. Keeps track of the tiles and their rotation.
-Takes care of rendering the in-game screen."""
+Takes care of rendering the in-game screen.
+Maps too big for the screen are looked at through a camera, which the player can pan and zoom.
+Everything the map keeps for drawing is bounded by the size of the screen, not the size of the map:
+the board surface only holds the part of the map on the screen, the tiles that aren't rotating are drawn straight from
+the shared images of the frame atlas and only the rotating tiles have sprites."""
 import math
+from concurrent.futures import ThreadPoolExecutor
 from pygame import Surface
 from game_data import GameData
-from level_generator import generate_level, is_solved
+from level_cache import LevelCache
+from level_store import LevelStore
+from hint_engine import HintEngine
+from camera import Camera
+from minimap import Minimap
+from chunked_level import ChunkedLevel, is_generated_lazily, complete_level_map
+from level_generator import is_solved, count_dangling_edges, count_dangling_edges_at, tile_is_out_of_borders, \
+    get_map_size, rotations, get_rotation_deltas, apply_rotation_deltas, get_chunk_grid_size
+from board_code import encode_board, decode_board, encode_rotations, decode_rotations
+import numpy as np
 import pygame
 from enums import TileType, GameStyle
 import tile as tile_module
 from tile import Tile
-from colors import black, green
+from colors import black, green, white, yellow
 import resource_locations as res
 from music import SoundManager
+from resource_manager import resources
 
 
 DONE_ANIM_SPEED = 30
+CURSOR_WIDTH = 3
+HINT_WIDTH = 5
+PAN_SPEED = 20  # the number of pixels the camera moves per frame while a pan key is held
+ZOOM_KEY_STEPS = {pygame.K_PLUS: 1, pygame.K_EQUALS: 1, pygame.K_KP_PLUS: 1, pygame.K_MINUS: -1, pygame.K_KP_MINUS: -1}
+VERIFY_SOLVED_STATE = False  # checks the tracked dangling edges against a full is_solved on every click if True
 
 
 class Map:
     """Represents the map on which the game will be played.
     Takes care of rendering the in-game screen and the gameplay."""
-    def __init__(self, screen, game_data):
+    def __init__(self, screen, game_data, level_store=None):
         """Initializes a new instance of the map class.
-        Takes the screen to draw on and the game data class as parameters.
+        Takes the screen to draw on, the game data class and optionally the level store to keep levels in as parameters.
         :type screen: Surface
-        :type game_data: GameData"""
+        :type game_data: GameData
+        :type level_store: LevelStore"""
         self.screen = screen
         self.game_data = game_data
         self.level = 1
-        self.level_map = generate_level(self.level)
-        self.tile_shape = (self.screen.get_width() // self.level_map.shape[0],
-                           self.screen.get_height() // self.level_map.shape[1])
-        self.tiles = pygame.sprite.Group()
+        self.levels = LevelCache(level_store)
+        self.chunks = None  # the chunked level the level map belongs to, if it's generated chunk by chunk
+        self.level_map = self.levels.get(self.level)
+        self.start_map = self.level_map.copy()  # the tiles the way they were generated
+        self.progress_changed = False  # whether tiles were rotated since the progress on the level was saved
+        self.dangling_edges = count_dangling_edges(self.level_map)
+        self.camera = Camera(self.screen.get_size())
+        self.camera.set_board(self.level_map.shape)
+        self.tile_shape = self.camera.get_tile_shape()
+        self.minimap = Minimap(self.screen)
+        self.tile_images = []  # the images of the tiles that aren't rotating, indexed by the number of the tile
+        self.tile_grid = {}  # the sprites of the rotating tiles by their grid position
+        self.active_tiles = pygame.sprite.Group()
+        self.pan_keys = set()
+        self.dragging = False
+        self.cursor = None
+        self.drawn_cursor = None
+        self.hints = HintEngine()
+        self.exporter = ThreadPoolExecutor(max_workers=1, thread_name_prefix="board-code")
+        self.hint = None  # the cell of the tile the last hint found and the tile it must become, if known
+        self.drawn_hint = None
+        self.redraw_all = True
         self.sound = SoundManager(self.game_data)
-        self.map = pygame.Surface(self.screen.get_size())
+        self.board = pygame.Surface(self.screen.get_size())
         self.background = pygame.Surface(self.screen.get_size())
         self.background.fill(black)
-        self.click_sound = pygame.mixer.Sound(res.SOUND_SNAP)
+        self.click_sound = resources.get_sound(res.SOUND_SNAP)
         self.done = False
-        self.done_c_rad = - ((90 // tile_module.TURN_SPEED) * DONE_ANIM_SPEED)
-        self.diag = math.sqrt(pow(self.map.get_width(), 2) + pow(self.map.get_height(), 2))
-        self.center = (self.map.get_width() // 2, self.map.get_height() // 2)
+        self.done_speed = DONE_ANIM_SPEED
+        self.done_c_rad = - ((90 // tile_module.TURN_SPEED) * self.done_speed)
+        self.diag = math.sqrt(pow(self.board.get_width(), 2) + pow(self.board.get_height(), 2))
+        self.center = (self.board.get_width() // 2, self.board.get_height() // 2)  # in board pixels
 
     def draw_map(self):
-        """Draws the map on the screen each tick"""
-        self.tiles.clear(self.map, self.background)
-        self.tiles.update()
-        if self.done:
-            if self.done_c_rad < self.diag:
-                self.done_c_rad += DONE_ANIM_SPEED
-            if self.done_c_rad >= 0:
-                pygame.draw.circle(self.map, green, self.center, self.done_c_rad)
-        self.tiles.draw(self.map)
-        self.screen.blit(self.map, (0, 0))
-
-    def handle_click(self, mouse_pos, button):
-        """Handles the click event sent by pygame. Used to rotate the tiles and to advance a level if done."""
+        """Draws the map on the screen each tick.
+        The tiles that aren't rotating are baked into the board surface, only the rotating tiles are drawn as sprites,
+        so drawing a frame only depends on the number of rotating tiles, not on the size of the map.
+        Returns the dirty rects, meaning the parts of the screen that changed and need to be updated on the display."""
+        self.take_hint()
+        self.pan_with_keys()
+        if self.redraw_all:
+            self.redraw_all = False
+            self.animate_tiles()
+            self.animate_success_circle()
+            self.draw_area(self.screen.get_rect())
+            self.draw_hint()
+            self.draw_cursor()
+            self.draw_minimap()
+            return [self.screen.get_rect()]
+        dirty = self.animate_tiles()
+        dirty += self.animate_success_circle()
+        if self.drawn_hint is not None and self.drawn_hint != self.get_hint_cell():
+            dirty.append(self.get_cell_rect(self.drawn_hint))
+        if self.drawn_cursor is not None and self.drawn_cursor != self.cursor:
+            dirty.append(self.get_cell_rect(self.drawn_cursor))
+        for area in dirty:
+            self.draw_area(area)
+        for rect in (self.draw_hint(), self.draw_cursor()):
+            if rect is not None:
+                dirty.append(rect)
+        if self.minimap.needs_redraw() or self.minimap.rect.collidelist(dirty) != -1:
+            minimap_rect = self.draw_minimap()
+            if minimap_rect is not None:
+                dirty.append(minimap_rect)
+        return dirty
+
+    def draw_cursor(self):
+        """Draws the keyboard cursor onto the screen, if it is shown. Returns the area it covers, None if not shown."""
+        self.drawn_cursor = self.cursor
+        if self.cursor is None or not self.camera.is_visible(self.cursor):
+            return None
+        cursor_rect = self.get_cell_rect(self.cursor)
+        pygame.draw.rect(self.screen, white, cursor_rect, CURSOR_WIDTH)
+        return cursor_rect
+
+    def draw_hint(self):
+        """Draws the highlight of the tile the last hint found onto the screen, if there is one.
+        Returns the area it covers, None if there is no hint."""
+        self.drawn_hint = self.get_hint_cell()
+        if self.drawn_hint is None or not self.camera.is_visible(self.drawn_hint):
+            return None
+        hint_rect = self.get_cell_rect(self.drawn_hint)
+        pygame.draw.rect(self.screen, yellow, hint_rect, HINT_WIDTH)
+        return hint_rect
+
+    def draw_minimap(self):
+        """Draws the minimap onto the screen, if the map doesn't fit on the screen.
+        Returns the area it covers, None if it isn't shown."""
+        if self.camera.shows_whole_board():
+            return None
+        return self.minimap.draw(self.camera)
+
+    def animate_tiles(self):
+        """Advances the animation of all rotating tiles and bakes the ones that stopped rotating back into the board.
+        Returns the areas the rotating tiles covered before and after."""
+        dirty = []
+        for tile in self.active_tiles.sprites():
+            old_rect = tile.rect.copy()
+            tile.update()
+            if tile.animation_running == 0:
+                self.active_tiles.remove(tile)
+                del self.tile_grid[tile.grid_pos]
+                self.bake_tile(tile)
+            dirty.append(old_rect.union(tile.rect))
+        return dirty
+
+    def animate_success_circle(self):
+        """Grows the success circle if the level is done. Only the cells in the ring the circle grew by are baked again,
+        so a frame costs as much as that ring, not as much as the whole circle.
+        Returns the areas that changed, which are empty if the circle didn't grow."""
+        if not self.done or self.done_c_rad >= self.diag:
+            return []
+        last_radius = self.done_c_rad
+        self.done_c_rad += self.done_speed
+        if self.done_c_rad < 0:
+            return []
+        center = self.camera.to_screen(self.center)
+        pygame.draw.circle(self.background, green, center, self.done_c_rad)
+        return self.bake_ring(center, last_radius, self.done_c_rad)
+
+    def bake_ring(self, center, inner_radius, outer_radius):
+        """Bakes the cells touching the ring between the given radii around the given point on the screen again.
+        Returns the areas of the baked cells, one for each row of cells and side of the ring.
+        :type center: tuple
+        :type inner_radius: int
+        :type outer_radius: int"""
+        area = pygame.Rect(0, 0, 2 * outer_radius + 2, 2 * outer_radius + 2)
+        area.center = center
+        area = area.clip(self.board.get_rect())
+        left, top, right, bottom = self.camera.get_visible_cells(area)
+        if left >= right or top >= bottom:
+            return []
+        self.generate_chunks(left, top, right, bottom)
+        width, height = self.tile_shape
+        x0, y0 = self.camera.to_screen((left * width, top * height))
+        xs = x0 + np.arange(right - left) * width  # the left edges of the columns on the screen
+        ys = y0 + np.arange(bottom - top) * height
+        # The distances to the nearest and the farthest pixel of every cell, one pixel more generous than the circle
+        near_x = np.maximum(np.maximum(xs - center[0], center[0] - xs - width), 0)
+        near_y = np.maximum(np.maximum(ys - center[1], center[1] - ys - height), 0)
+        far_x = np.maximum(np.abs(xs - center[0]), np.abs(xs + width - center[0]))
+        far_y = np.maximum(np.abs(ys - center[1]), np.abs(ys + height - center[1]))
+        ring = ((near_x[:, np.newaxis] ** 2 + near_y ** 2 <= (outer_radius + 1) ** 2) &
+                (far_x[:, np.newaxis] ** 2 + far_y ** 2 >= max(inner_radius - 1, 0) ** 2))
+        # On either side of the center, the cells of a row that touch the ring are next to each other
+        left_side = xs + width // 2 < center[0]
+        tiles = self.level_map[left:right, top:bottom]
+        board_rect = self.board.get_rect()
+        dirty = []
+        blits = []
+        for y in range(bottom - top):
+            for side in (left_side, ~left_side):
+                columns = np.flatnonzero(ring[:, y] & side)
+                if len(columns) == 0:
+                    continue
+                row_rect = pygame.Rect(int(xs[columns[0]]), int(ys[y]), len(columns) * width, height).clip(board_rect)
+                self.board.blit(self.background, row_rect, row_rect)
+                dirty.append(row_rect)
+                for x in columns:
+                    if tiles[x, y] != 0 and (left + x, top + y) not in self.tile_grid:
+                        blits.append((self.tile_images[tiles[x, y]], (int(xs[x]), int(ys[y]))))
+        self.board.blits(blits, False)
+        return dirty
+
+    def draw_background(self):
+        """Draws the background of the board, which is black with the success circle on top if the level is done."""
+        self.background.fill(black)
+        if self.done and self.done_c_rad >= 0:
+            pygame.draw.circle(self.background, green, self.camera.to_screen(self.center), self.done_c_rad)
+
+    def draw_area(self, area):
+        """Draws the given area of the board and the rotating tiles touching it onto the screen.
+        :type area: pygame.Rect"""
+        self.screen.set_clip(area)
+        self.screen.blit(self.board, area, area)
+        tiles = self.active_tiles.sprites()
+        for i in area.collidelistall(tiles):
+            self.screen.blit(tiles[i].image, tiles[i].rect)
+        self.screen.set_clip(None)
+
+    def bake_tile(self, tile):
+        """Bakes the given tile into the board surface, on top of the background.
+        :type tile: Tile"""
+        cell_rect = self.get_cell_rect(tile.grid_pos)
+        self.board.blit(self.background, cell_rect, cell_rect)
+        self.board.blit(tile.image, tile.rect)
+
+    def un_bake_tile(self, tile):
+        """Removes the given tile from the board surface, so it can be drawn as a rotating sprite.
+        :type tile: Tile"""
+        cell_rect = self.get_cell_rect(tile.grid_pos)
+        self.board.blit(self.background, cell_rect, cell_rect)
+
+    def bake_area(self, area):
+        """Bakes the given area of the board again, drawing the background and the tiles that aren't rotating.
+        :type area: pygame.Rect"""
+        self.board.set_clip(area)
+        self.board.blit(self.background, area, area)
+        left, top, right, bottom = self.camera.get_visible_cells(area)
+        self.generate_chunks(left, top, right, bottom)
+        x0, y0 = self.camera.to_screen((left * self.tile_shape[0], top * self.tile_shape[1]))
+        tiles = self.level_map[left:right, top:bottom]
+        width, height = self.tile_shape
+        blits = []
+        for x, y in zip(*tiles.nonzero()):
+            if (left + x, top + y) not in self.tile_grid:
+                blits.append((self.tile_images[tiles[x, y]], (x0 + x * width, y0 + y * height)))
+        self.board.blits(blits, False)
+        self.board.set_clip(None)
+
+    def is_animating(self):
+        """Returns True if something on the map is moving, meaning a tile is rotating or the success circle grows.
+        A hint that is being searched for and the camera panning while a key is held count as well."""
+        return len(self.active_tiles) > 0 or (self.done and self.done_c_rad < self.diag) or \
+            self.hints.is_pending() or len(self.pan_keys) > 0
+
+    def invalidate(self):
+        """Makes the next call of draw_map redraw the whole map, used when something else was drawn on the screen."""
+        self.redraw_all = True
+
+    def handle_click(self, mouse_pos, button, mod=0):
+        """Handles the click event sent by pygame. Used to rotate the tiles and to advance a level if done.
+        A right click while holding shift asks for a hint, a click on the minimap moves the camera there
+        and releasing the middle mouse button stops dragging the map.
+        :type mouse_pos: tuple
+        :type button: int
+        :type mod: int"""
+        if button == 2:
+            self.dragging = False
         if button != 1 and button != 3:
             return
+        if button == 3 and mod & pygame.KMOD_SHIFT:
+            self.request_hint()
+            return
+        if not self.camera.shows_whole_board() and self.minimap.get_cell_at(mouse_pos) is not None:
+            self.move_camera_to(self.minimap.get_cell_at(mouse_pos))
+            return
         if self.done:
             self.set_level(self.level + 1)
             self.reset_done()
             return
-        for tile in self.tiles:
-            if tile.is_pos_on_tile(mouse_pos):
-                self.sound.play_sound(self.click_sound)
-                if button == 1:
-                    tile.rotate_cw()
-                else:
-                    tile.rotate_ccw()
-                self.level_map[tile.grid_pos] = tile.get_tile_as_num()
-                self.check_level_solved()
+        tile = self.get_tile(self.get_cell_at(mouse_pos))
+        if tile is not None:
+            self.rotate_tile(tile, button == 1)
+
+    def handle_mouse_down(self, button):
+        """Handles the mouse button down event sent by pygame. Pressing the middle mouse button starts dragging the map.
+        :type button: int"""
+        if button == 2:
+            self.dragging = True
+
+    def handle_mouse_motion(self, rel):
+        """Handles the mouse motion event sent by pygame. Moves the camera along while the map is dragged.
+        :type rel: tuple"""
+        if self.dragging:
+            self.pan(-rel[0], -rel[1])
+
+    def handle_wheel(self, mouse_pos, steps):
+        """Handles the mouse wheel event sent by pygame. Zooms in or out, keeping the point under the mouse in place.
+        :type mouse_pos: tuple
+        :type steps: int"""
+        self.zoom(steps, mouse_pos)
+
+    def handle_key(self, key, mod):
+        """Handles the key down event sent by pygame. The arrow keys move the keyboard cursor over the map,
+        enter and space rotate the tile under the cursor clockwise (counterclockwise if shift is held)
+        and advance a level if done. H asks for a hint. W, A, S and D move the camera while they are held,
+        plus and minus zoom in and out.
+        :type key: int
+        :type mod: int"""
+        if key == pygame.K_h:
+            self.request_hint()
+        if key in pan_moves:
+            self.pan_keys.add(key)
+        if key in ZOOM_KEY_STEPS:
+            self.zoom(ZOOM_KEY_STEPS[key], self.screen.get_rect().center)
+        if key in cursor_moves:
+            if self.cursor is None:
+                self.cursor = (self.level_map.shape[0] // 2, self.level_map.shape[1] // 2)
+            else:
+                move = cursor_moves[key]
+                self.cursor = (min(max(self.cursor[0] + move[0], 0), self.level_map.shape[0] - 1),
+                               min(max(self.cursor[1] + move[1], 0), self.level_map.shape[1] - 1))
+            self.pan(*self.camera.get_pan_to(self.cursor))
+        if key != pygame.K_RETURN and key != pygame.K_SPACE:
+            return
+        if self.done:
+            self.set_level(self.level + 1)
+            self.reset_done()
+            return
+        tile = self.get_tile(self.cursor)
+        if tile is not None:
+            self.rotate_tile(tile, not mod & pygame.KMOD_SHIFT)
+
+    def handle_key_up(self, key):
+        """Handles the key up event sent by pygame. Stops moving the camera when a pan key is released.
+        :type key: int"""
+        self.pan_keys.discard(key)
+
+    def stop_moving(self):
+        """Stops moving the camera, used when the keys and mouse buttons may be released without the map noticing."""
+        self.pan_keys.clear()
+        self.dragging = False
+
+    def pan_with_keys(self):
+        """Moves the camera in the direction of the pan keys that are held, called each tick."""
+        dx = sum(pan_moves[key][0] for key in self.pan_keys) * PAN_SPEED
+        dy = sum(pan_moves[key][1] for key in self.pan_keys) * PAN_SPEED
+        self.pan(dx, dy)
+
+    def pan(self, dx, dy):
+        """Moves the camera by the given number of pixels. The board surface is scrolled along,
+        so only the strips of the map that came onto the screen have to be baked.
+        Rotating tiles that left the screen are dropped, the level map already has their new rotation.
+        :type dx: int
+        :type dy: int"""
+        dx, dy = self.camera.pan(dx, dy)
+        if dx == 0 and dy == 0:
+            return
+        self.draw_background()
+        self.board.scroll(-dx, -dy)
+        for tile in list(self.tile_grid.values()):
+            tile.move(-dx, -dy)
+            if not self.camera.is_visible(tile.grid_pos):
+                self.active_tiles.remove(tile)
+                del self.tile_grid[tile.grid_pos]
+        width, height = self.board.get_size()
+        if dx != 0:
+            self.bake_area(pygame.Rect(width - dx if dx > 0 else 0, 0, abs(dx), height))
+        if dy != 0:
+            self.bake_area(pygame.Rect(0, height - dy if dy > 0 else 0, width, abs(dy)))
+        self.invalidate()
+
+    def zoom(self, steps, anchor):
+        """Zooms in (positive steps) or out (negative steps), keeping the point of the map at the given position
+        on the screen in place. The part of the map on the screen is built again for the new tile size.
+        :type steps: int
+        :type anchor: tuple"""
+        old_size = self.tile_shape[0]
+        if not self.camera.zoom(steps, anchor):
+            return
+        self.done_c_rad = self.done_c_rad * self.camera.tile_size // old_size
+        self.update_view()
+
+    def move_camera_to(self, cell):
+        """Moves the camera so that the given cell is in the middle of the screen, as far as possible.
+        :type cell: tuple"""
+        old_x, old_y = self.camera.x, self.camera.y
+        self.camera.center_on(cell)
+        new_x, new_y = self.camera.x, self.camera.y
+        self.camera.x, self.camera.y = old_x, old_y
+        self.pan(new_x - old_x, new_y - old_y)
+
+    def get_cell_at(self, pos):
+        """Returns the grid position of the cell at the given position on the screen, None if it's outside the map.
+        Computed directly from the tile shape, so it takes the same time no matter how big the map is.
+        :type pos: tuple"""
+        return self.camera.get_cell_at(pos)
+
+    def get_cell_rect(self, cell):
+        """Returns the area the cell at the given grid position covers on the screen.
+        :type cell: tuple"""
+        return self.camera.get_cell_rect(cell)
+
+    def get_tile(self, cell):
+        """Returns the sprite of the tile at the given grid position. Only rotating tiles keep their sprite,
+        for all others a new one is created. Returns None if there is no tile or the position is outside the map.
+        :type cell: tuple"""
+        if cell is None or cell in self.tile_grid:
+            return self.tile_grid.get(cell)
+        if tile_is_out_of_borders(cell, self.level_map.shape) or self.level_map[cell] == 0:
+            return None
+        return create_tile(self.level_map[cell], self.tile_shape, self.get_cell_rect(cell).topleft, cell,
+                           self.game_data.get_style())
+
+    def rotate_tile(self, tile, clockwise):
+        """Rotates the given tile, plays the click sound and checks whether the level is solved afterwards.
+        :type tile: Tile
+        :type clockwise: bool"""
+        self.sound.play_sound(self.click_sound)
+        if clockwise:
+            tile.rotate_cw()
+        else:
+            tile.rotate_ccw()
+        if not self.active_tiles.has(tile):
+            self.un_bake_tile(tile)
+            self.active_tiles.add(tile)
+            self.tile_grid[tile.grid_pos] = tile
+        self.set_tile(tile.grid_pos, tile.get_tile_as_num())
+        self.check_level_solved()
+
+    def request_hint(self):
+        """Starts looking for a hint in the background. The tile it finds is highlighted as soon as it is found."""
+        if self.done:
+            return
+        self.hints.request(self.level_map, self.chunks)
+
+    def take_hint(self):
+        """Takes the result of the hint search, if it is done, and shows it.
+        Takes over the chunks the search generated as well."""
+        if not self.hints.is_pending():
+            return
+        result = self.hints.get_result()
+        if result is None:
+            return
+        hint, chunks = result
+        self.add_chunks(chunks)
+        if hint is not None:
+            self.hint = hint
+
+    def clear_hint(self):
+        """Cancels the hint search and removes the shown hint, used when the board changed."""
+        self.hints.cancel()
+        self.hint = None
+
+    def get_hint_cell(self):
+        """Returns the cell of the tile the shown hint is about, None if no hint is shown."""
+        if self.hint is None:
+            return None
+        return self.hint[0]
+
+    def set_tile(self, grid_pos, tile):
+        """Sets the tile at the given grid position in the level map
+        and updates the number of dangling edges by looking only at the sides of that tile.
+        Any hint is outdated after that, so it is removed.
+        :type grid_pos: tuple
+        :type tile: int"""
+        self.clear_hint()
+        before = count_dangling_edges_at(self.level_map, grid_pos)
+        self.level_map[grid_pos] = tile
+        self.dangling_edges += count_dangling_edges_at(self.level_map, grid_pos) - before
+        self.minimap.update_tile(self.level_map, grid_pos)
+        self.progress_changed = True
 
     def check_level_solved(self):
         """Checks whether the current level is solved and sets the map to done if it is."""
-        if is_solved(self.level_map):
+        if self.chunks is not None and not self.chunks.is_complete():
+            return
+        if VERIFY_SOLVED_STATE:
+            assert (self.dangling_edges == 0) == is_solved(self.level_map)
+        if self.dangling_edges == 0:
             self.game_data.update_max_level_if_higher(self.level + 1)
             self.set_done()
 
     def set_done(self):
         """Notifies the map class that the level was completed, but the player didn't advance to the next level yet."""
         self.done = True
-        self.sound.play_sound(pygame.mixer.Sound(res.SOUND_SUCCESS))
+        self.save_progress()
+        self.sound.play_sound(resources.get_sound(res.SOUND_SUCCESS))
 
     def reset_done(self):
         """Notifies the map class that the player did advance to the next level."""
         self.done = False
-        self.done_c_rad = - ((90 // tile_module.TURN_SPEED) * DONE_ANIM_SPEED)  # The delay for the success animation
+        self.done_c_rad = - ((90 // tile_module.TURN_SPEED) * self.done_speed)  # The delay for the success animation
         # is calculated in a way that it starts when the turn animation of the tile ends
 
     def update_level_map(self):
         """Updates the level map after the level number has been set."""
-        self.tiles.empty()
-        self.map.blit(self.background, (0, 0))
-        for x in range(self.level_map.shape[0]):
-            for y in range(self.level_map.shape[1]):
-                i = (x, y)
-                if self.level_map[i] == 0:
-                    continue
-                tile = create_tile(self.level_map[i], self.tile_shape,
-                                   (x * self.tile_shape[0], y * self.tile_shape[1]), i, self.game_data.get_style())
-                self.tiles.add(tile)
+        self.cursor = None
+        self.stop_moving()
+        self.clear_hint()
+        self.camera.set_board(self.level_map.shape)
+        self.minimap.set_level(self.level_map)
+        self.update_view()
 
-    def set_level(self, level):
-        """Sets the level of the map and generates the map accordingly."""
+    def update_view(self):
+        """Builds the part of the map on the screen again, after the level or the tile size changed.
+        Only the images for the current tile size are built and the board surface is baked again."""
+        self.tile_grid = {}
+        self.active_tiles.empty()
+        self.tile_shape = self.camera.get_tile_shape()
+        style = self.game_data.get_style()
+        tile_module.build_frame_atlas(self.tile_shape, style)
+        self.tile_images = get_tile_images(self.tile_shape, style)
+        width, height = self.camera.get_board_size()
+        self.diag = math.sqrt(pow(width, 2) + pow(height, 2))
+        self.center = (width // 2, height // 2)
+        # The success circle takes as long to cover a big map as to cover one that fits on the screen
+        self.done_speed = max(DONE_ANIM_SPEED, int(DONE_ANIM_SPEED * self.diag / math.hypot(*self.screen.get_size())))
+        self.invalidate()
+        self.draw_background()
+        self.bake_area(self.board.get_rect())
+
+    def set_level(self, level, deltas=None):
+        """Sets the level of the map and generates the map accordingly.
+        Starts generating the next level in the background, so advancing to it doesn't have to wait.
+        Levels that are too big to be generated at once are generated chunk by chunk while they are shown instead.
+        The progress on the last level is saved and the tiles are rotated the way they were left on the new level,
+        unless the number of steps every tile is rotated by is given.
+        :type level: int
+        :type deltas: ndarray"""
+        self.save_progress()
         self.level = level
-        self.level_map = generate_level(self.level)
-        self.tile_shape = (self.screen.get_width() // self.level_map.shape[0],
-                           self.screen.get_height() // self.level_map.shape[1])
+        if deltas is None:
+            deltas = self.load_progress()
+        if is_generated_lazily(self.level):
+            self.chunks = ChunkedLevel(self.level, deltas)
+            self.start_map = self.chunks.start_map
+            self.level_map = self.chunks.level_map
+        else:
+            self.chunks = None
+            self.start_map = self.levels.get(self.level)
+            if deltas is None:
+                self.level_map = self.start_map.copy()
+            else:
+                self.level_map = apply_rotation_deltas(self.start_map, deltas)
+        self.progress_changed = False
+        self.dangling_edges = count_dangling_edges(self.level_map)
         self.update_level_map()
+        if not is_generated_lazily(self.level + 1):
+            self.levels.prefetch(self.level + 1)
+
+    def save_progress(self):
+        """Saves the rotations of the tiles of the current level to the game data, if any tile was rotated
+        since they were saved last. The progress is removed once the level is done."""
+        if not self.progress_changed:
+            return
+        self.progress_changed = False
+        if self.chunks is not None:
+            deltas = self.chunks.get_rotation_deltas()
+        else:
+            deltas = get_rotation_deltas(self.start_map, self.level_map)
+        if self.done or not deltas.any():
+            self.game_data.set_board_progress(self.level, None)
+        else:
+            self.game_data.set_board_progress(self.level, encode_rotations(deltas))
+
+    def load_progress(self):
+        """Returns the rotations of the tiles of the current level saved in the game data,
+        None if there are none or they were saved for another version of the level."""
+        code = self.game_data.get_board_progress(self.level)
+        if code is None:
+            return None
+        try:
+            return decode_rotations(code, get_map_size(self.level))
+        except ValueError:
+            return None
+
+    def generate_chunks(self, left, top, right, bottom):
+        """Generates the chunks of the given range of cells, if the level is generated chunk by chunk
+        and they weren't generated yet. The range is given as the first column, first row, last column plus one
+        and last row plus one. The dangling connections are counted again once the last chunk was generated,
+        until then they aren't known.
+        :type left: int
+        :type top: int
+        :type right: int
+        :type bottom: int"""
+        if self.chunks is None:
+            return
+        areas = self.chunks.generate_area(left, top, right, bottom)
+        for area in areas:
+            self.minimap.update_area(self.level_map, *area)
+        if areas and self.chunks.is_complete():
+            self.dangling_edges = count_dangling_edges(self.level_map)
+
+    def add_chunks(self, chunks):
+        """Takes over chunks of the chunked level that were generated on a background worker,
+        except for the ones that were generated in the meantime.
+        :type chunks: list"""
+        if self.chunks is None or not chunks:
+            return
+        areas = [area for area in (self.chunks.add_chunk(chunk, tiles) for chunk, tiles in chunks) if area is not None]
+        if not areas:
+            return
+        self.minimap.set_level(self.level_map)
+        if self.chunks.is_complete():
+            self.dangling_edges = count_dangling_edges(self.level_map)
+
+    def export_board_code(self, path):
+        """Writes the board code of the current level with the current rotations of its tiles to the file at the given
+        path. The writing happens on a background worker, which also generates the missing chunks of a chunked level.
+        :type path: str"""
+        if self.chunks is None:
+            self.exporter.submit(write_board_code, path, self.level, self.level_map.copy(), None, [])
+        else:
+            self.exporter.submit(write_board_code, path, self.level, self.level_map.copy(), self.chunks.deltas,
+                                 self.chunks.get_missing_chunks())
+
+    def load_board_code(self, code):
+        """Sets the level of the given board code and rotates the tiles the way the code tells.
+        Raises a ValueError if the code is broken, its level isn't unlocked yet or its tiles can't be rotated into
+        the tiles of its level, in which case the current board is left untouched.
+        :type code: str"""
+        level, level_map = decode_board(code)
+        if level < 1 or level_map.shape != get_map_size(level):
+            raise ValueError("Board code doesn't match the size of level " + str(level))
+        if level > self.game_data.get_max_level():
+            raise ValueError("Level " + str(level) + " of the board code isn't unlocked yet")
+        chunks = []
+        if is_generated_lazily(level):
+            # Generated into a map of its own, so the current board stays untouched until the code is accepted
+            width, height = get_chunk_grid_size(level_map.shape)
+            start_map = np.zeros_like(level_map)
+            chunks = complete_level_map(level, start_map, np.zeros_like(level_map),
+                                        [(cx, cy) for cx in range(width) for cy in range(height)])
+        else:
+            start_map = self.levels.get(level)
+        if not (rotations[start_map] == level_map[..., np.newaxis]).any(axis=-1).all():
+            raise ValueError("Board code doesn't match the tiles of level " + str(level))
+        self.set_level(level, get_rotation_deltas(start_map, level_map))
+        self.add_chunks(chunks)
+        self.progress_changed = True
+        self.check_level_solved()
+
+    def close(self):
+        """Saves the progress on the current level and stops the background workers of the map,
+        cancelling the hint search and the prefetching of levels. Waits for a board code that is being written."""
+        self.save_progress()
+        self.hints.close()
+        self.levels.close()
+        self.exporter.shutdown()
+
+
+# The direction the keyboard cursor moves in for each arrow key
+cursor_moves = {
+    pygame.K_LEFT: (-1, 0),
+    pygame.K_UP: (0, -1),
+    pygame.K_RIGHT: (1, 0),
+    pygame.K_DOWN: (0, 1)
+}
+
+
+# The direction the camera moves in for each pan key
+pan_moves = {
+    pygame.K_a: (-1, 0),
+    pygame.K_w: (0, -1),
+    pygame.K_d: (1, 0),
+    pygame.K_s: (0, 1)
+}
 
 
 tile_infos = {
@@ -138,3 +707,28 @@ def create_tile(tile, shape, pos, grid_pos, style):
     :type grid_pos: tuple
     :type style: GameStyle"""
     return Tile(tile_infos[tile]["type"], tile_infos[tile]["rot"], shape, pos, grid_pos, style)
+
+
+def write_board_code(path, level, level_map, deltas, chunks):
+    """Writes the board code of the given level map to the file at the given path, after generating the given missing
+    chunks of the chunked level with the given number into it. Runs on a background worker.
+    :type path: str
+    :type level: int
+    :type level_map: ndarray
+    :type deltas: ndarray
+    :type chunks: list"""
+    complete_level_map(level, level_map, deltas, chunks)
+    with open(path, 'w') as f:
+        f.write(encode_board(level, level_map))
+
+
+def get_tile_images(shape, style):
+    """Returns the images of all tiles that aren't rotating for the given size and style, taken from the frame atlas.
+    Indexed by the number of the tile, there is no image for the empty tile.
+    :type shape: tuple
+    :type style: GameStyle"""
+    images = [None]
+    for tile in range(1, 16):
+        info = tile_infos[tile]
+        images.append(tile_module.get_frames(info["type"], shape, style)[info["rot"] * tile_module.FRAMES_PER_TURN])
+    return images
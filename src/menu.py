@@ -0,0 +1,123 @@
+"""Contains the menu class, which keeps a composed menu screen and its buttons between frames and state switches.
+Only the buttons that changed since the last frame are drawn again, and only the areas they cover are updated."""
+import pygame
+from pygame import Surface
+from button import Button
+from colors import black
+from utility import center_horizontally
+
+
+TITLE_Y = 50
+OVERLAY_ALPHA = 240
+
+
+class Menu:
+    """A retained menu screen. Used by the GUI class for the main, pause and settings menus."""
+    def __init__(self, screen, title, overlay=False, hide_disabled=False):
+        """Initializes a new menu drawn on the given screen with the given rendered title.
+        An overlay menu is drawn over whatever was on the screen when the menu was shown, darkening it.
+        If hide_disabled is True, disabled buttons are not drawn at all.
+        :type screen: Surface
+        :type title: Surface
+        :type overlay: bool
+        :type hide_disabled: bool"""
+        self.screen = screen
+        self.title = title
+        self.overlay = overlay
+        self.hide_disabled = hide_disabled
+        self.buttons = []  # type: list[Button]
+        self.background = None
+        self.surface = None
+        self.drawn_buttons = {}
+        self.redraw_all = True
+
+    def invalidate(self):
+        """Makes the next call of draw put the whole menu on the screen again, used when the menu is shown again.
+        The buttons aren't hovered any more, since the mouse was moved elsewhere in the meantime."""
+        self.redraw_all = True
+        for button in self.buttons:
+            button.un_hover()
+        if self.overlay:
+            self.background = None
+
+    def draw(self):
+        """Draws the menu onto the screen. Only the buttons that changed since the last call are drawn again.
+        Returns the dirty rects, meaning the parts of the screen that changed and need to be updated on the display."""
+        if self.background is None:
+            self.compose()
+        dirty = self.update_buttons()
+        if self.redraw_all:
+            self.redraw_all = False
+            self.screen.blit(self.surface, (0, 0))
+            return [self.screen.get_rect()]
+        for area in dirty:
+            self.screen.blit(self.surface, area, area)
+        return dirty
+
+    def compose(self):
+        """Composes the background of the menu with the title and draws all buttons on top of it."""
+        if self.overlay:
+            self.background = self.screen.copy()
+            overlay = pygame.Surface(self.screen.get_size())
+            overlay.set_alpha(OVERLAY_ALPHA)
+            overlay.fill(black)
+            self.background.blit(overlay, (0, 0))
+        else:
+            self.background = pygame.Surface(self.screen.get_size())
+            self.background.fill(black)
+        self.background.blit(self.title, (center_horizontally(self.title, self.screen.get_size()), TITLE_Y))
+        self.surface = self.background.copy()
+        self.drawn_buttons = {}
+        for button in self.buttons:
+            self.drawn_buttons[button] = self.get_button_state(button)
+            self.draw_button(button)
+
+    def update_buttons(self):
+        """Draws the buttons whose image, position or visibility changed onto the surface of the menu again.
+        Returns the areas that changed."""
+        dirty = []
+        for button in self.buttons:
+            state = self.get_button_state(button)
+            drawn = self.drawn_buttons.get(button)
+            if is_same_state(state, drawn):
+                continue
+            self.drawn_buttons[button] = state
+            rects = [get_state_rect(s) for s in (drawn, state) if s is not None]
+            dirty.append(rects[0].unionall(rects[1:]))
+        for area in dirty:
+            self.surface.set_clip(area)
+            self.surface.blit(self.background, area, area)
+            for button in self.buttons:
+                self.draw_button(button)
+            self.surface.set_clip(None)
+        return dirty
+
+    def get_button_state(self, button):
+        """Returns what the given button looks like on the menu: its rendered image and its position.
+        Returns None if it isn't drawn at all.
+        :type button: Button"""
+        if self.hide_disabled and not button.is_enabled():
+            return None
+        return button.get_rendered_button(), button.get_position()
+
+    def draw_button(self, button):
+        """Draws the given button onto the surface of the menu, if it is visible.
+        :type button: Button"""
+        state = self.get_button_state(button)
+        if state is not None:
+            self.surface.blit(state[0], state[1])
+
+
+def get_state_rect(state):
+    """Returns the area covered by a button in the given state, as returned by Menu.get_button_state.
+    :type state: tuple"""
+    return state[0].get_rect(topleft=state[1])
+
+
+def is_same_state(state, other):
+    """Returns True if a button in the given state looks the same as one in the other state.
+    :type state: tuple
+    :type other: tuple"""
+    if state is None or other is None:
+        return state is other
+    return state[0] is other[0] and state[1] == other[1]
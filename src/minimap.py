@@ -0,0 +1,103 @@
+"""Contains the minimap, a small picture of the whole map in a corner of the screen. It is shown while the map doesn't
+fit on the screen completely. Every tile is a single pixel: dark where there is no tile, grey for a tile and red for
+a tile with a dangling connection, so the player can see where the unsolved parts of the map are.
+The part of the map that is on the screen is outlined. The picture of the map uses a palette of one byte per pixel
+and only the pixels of tiles that changed are updated."""
+import numpy as np
+import pygame
+from colors import white
+from level_generator import get_dangling_cells, count_dangling_edges_at, get_direction_indices, \
+    tile_is_out_of_borders
+
+
+MINIMAP_SIZE = 200  # the size of the longer side of the minimap in pixels
+MINIMAP_MARGIN = 10  # the distance of the minimap to the corner of the screen
+# The color of an empty cell, a tile and a tile with a dangling connection, also their index in the palette
+minimap_colors = [(30, 30, 30), (150, 150, 150), (220, 40, 40)]
+
+
+class Minimap:
+    """The minimap shown in the bottom right corner of the screen."""
+    def __init__(self, screen):
+        """Initializes a new minimap drawn on the given screen. It shows nothing until a level is set.
+        :type screen: Surface"""
+        self.screen = screen
+        self.board_shape = (1, 1)
+        self.source = None
+        self.image = None
+        self.rect = pygame.Rect(0, 0, 0, 0)
+
+    def set_level(self, level_map):
+        """Draws the picture of the given level map.
+        :type level_map: ndarray"""
+        self.board_shape = level_map.shape
+        indices = np.where(level_map != 0, 1, 0).astype(np.uint8)
+        indices[get_dangling_cells(level_map)] = 2
+        self.source = pygame.Surface(level_map.shape, depth=8)
+        self.source.set_palette(minimap_colors)
+        pygame.surfarray.blit_array(self.source, indices)
+        scale = MINIMAP_SIZE / max(level_map.shape)
+        self.rect = pygame.Rect(0, 0, max(1, int(level_map.shape[0] * scale)), max(1, int(level_map.shape[1] * scale)))
+        self.rect.bottomright = (self.screen.get_width() - MINIMAP_MARGIN, self.screen.get_height() - MINIMAP_MARGIN)
+        self.image = None
+
+    def update_tile(self, level_map, index):
+        """Updates the pixels of the tile at the given index and the tiles next to it, after the tile changed.
+        :type level_map: ndarray
+        :type index: tuple"""
+        for cell in (index,) + get_direction_indices(index):
+            if tile_is_out_of_borders(cell, level_map.shape):
+                continue
+            if level_map[cell] == 0:
+                color = 0
+            else:
+                color = 2 if count_dangling_edges_at(level_map, cell) > 0 else 1
+            self.source.set_at(cell, minimap_colors[color])
+        self.image = None
+
+    def update_area(self, level_map, left, top, right, bottom):
+        """Updates the pixels of the given range of cells and the cells around it, after they changed all at once.
+        The range is given as the first column, first row, last column plus one and last row plus one.
+        :type level_map: ndarray
+        :type left: int
+        :type top: int
+        :type right: int
+        :type bottom: int"""
+        width, height = level_map.shape
+        # The cells two steps away are only looked at, so that every updated cell sees all of its neighbours
+        x0, y0, x1, y1 = max(left - 2, 0), max(top - 2, 0), min(right + 2, width), min(bottom + 2, height)
+        tiles = level_map[x0:x1, y0:y1]
+        indices = np.where(tiles != 0, 1, 0).astype(np.uint8)
+        indices[get_dangling_cells(tiles)] = 2
+        ux0, uy0, ux1, uy1 = max(left - 1, 0), max(top - 1, 0), min(right + 1, width), min(bottom + 1, height)
+        pixels = pygame.surfarray.pixels2d(self.source)
+        pixels[ux0:ux1, uy0:uy1] = indices[ux0 - x0:ux1 - x0, uy0 - y0:uy1 - y0]
+        del pixels
+        self.image = None
+
+    def needs_redraw(self):
+        """Returns True if the picture of the map changed since the minimap was drawn last."""
+        return self.image is None
+
+    def draw(self, camera):
+        """Draws the minimap onto the screen, outlining the part of the map the given camera shows.
+        Returns the area it covers.
+        :type camera: Camera"""
+        if self.image is None:
+            self.image = pygame.transform.scale(self.source, self.rect.size)
+        self.screen.blit(self.image, self.rect)
+        width, height = camera.get_board_size()
+        view = pygame.Rect(self.rect.x + camera.x * self.rect.width // width,
+                           self.rect.y + camera.y * self.rect.height // height,
+                           max(2, camera.viewport.width * self.rect.width // width),
+                           max(2, camera.viewport.height * self.rect.height // height))
+        pygame.draw.rect(self.screen, white, view.clip(self.rect), 1)
+        return self.rect
+
+    def get_cell_at(self, pos):
+        """Returns the cell of the map shown at the given position on the screen, None if it isn't on the minimap.
+        :type pos: tuple"""
+        if not self.rect.collidepoint(pos):
+            return None
+        return ((pos[0] - self.rect.x) * self.board_shape[0] // self.rect.width,
+                (pos[1] - self.rect.y) * self.board_shape[1] // self.rect.height)
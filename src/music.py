@@ -4,6 +4,11 @@ from game_data import GameData
 from pygame.mixer import Sound
 
 
+FADEOUT_TIME = 100  # milliseconds
+fade_end = 0  # the time (in milliseconds since pygame.init) at which the current fadeout of the music ends
+music_loaded = False  # no music is loaded in a headless run
+
+
 class SoundManager:
     """A class to manage playing sounds, which keeps its own access to the game data."""
     def __init__(self, game_data):
@@ -13,7 +18,7 @@ class SoundManager:
 
     def play_music(self):
         """Starts to infinitely loop the currently loaded music from the beginning."""
-        if not self.game_data.is_music_on():
+        if not self.game_data.is_music_on() or not music_loaded:
             return
         pygame.mixer.music.rewind()
         pygame.mixer.music.play(-1)
@@ -29,9 +34,18 @@ class SoundManager:
 def load_music(path):
     """Loads the background music from the given path.
     :type path: str"""
+    global music_loaded
     pygame.mixer.music.load(path)
+    music_loaded = True
 
 
 def stop_music():
     """Stops the currently playing background music."""
-    pygame.mixer.music.fadeout(100)
+    global fade_end
+    pygame.mixer.music.fadeout(FADEOUT_TIME)
+    fade_end = pygame.time.get_ticks() + FADEOUT_TIME
+
+
+def is_transitioning():
+    """Returns True while the background music is fading out."""
+    return pygame.time.get_ticks() < fade_end
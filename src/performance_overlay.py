@@ -0,0 +1,95 @@
+"""Contains the performance overlay, which shows the frame rate, the frame times, the share of the time the game loop
+spent waiting for events and the statistics of the caches in a corner of the screen.
+It is drawn on top of everything else after every frame and removed again before the next frame is drawn,
+so the map and the menus never see it."""
+import time
+import pygame
+from colors import black, white
+from frame_stats import FrameStats
+from surface_cache import get_all_stats
+from text_helper import get_font
+
+
+OVERLAY_FONTS = ["Consolas", "DejaVu Sans Mono", "Courier New"]
+OVERLAY_FONT_SIZE = 16
+OVERLAY_POSITION = (5, 5)
+OVERLAY_SIZE = (420, 170)
+OVERLAY_ALPHA = 200
+UPDATE_INTERVAL = 0.25  # seconds between two updates of the shown numbers
+
+
+class PerformanceOverlay:
+    """The on-screen performance overlay, toggled by the control unit."""
+    def __init__(self, screen, frame_stats, level_cache, get_idle_ratio):
+        """Initializes a new hidden performance overlay, showing the given frame statistics
+        and the statistics of the given level cache as well as the surface caches.
+        Takes the function returning the share of the time the game loop spent waiting for events.
+        :type screen: Surface
+        :type frame_stats: FrameStats
+        :type level_cache: LevelCache
+        :type get_idle_ratio: function"""
+        self.screen = screen
+        self.frame_stats = frame_stats
+        self.level_cache = level_cache
+        self.get_idle_ratio = get_idle_ratio
+        self.shown = False
+        self.rect = pygame.Rect(OVERLAY_POSITION, OVERLAY_SIZE)
+        self.image = None
+        self.last_update = 0.0
+        self.covered = None
+
+    def toggle(self):
+        """Shows the overlay if it's hidden, hides it if it's shown."""
+        self.shown = not self.shown
+        self.image = None
+
+    def remove(self):
+        """Puts back what was on the screen before the overlay was drawn over it.
+        Returns the dirty rects, meaning the area of the overlay if it was on the screen."""
+        if self.covered is None:
+            return []
+        self.screen.blit(self.covered, self.rect)
+        self.covered = None
+        return [self.rect]
+
+    def draw(self):
+        """Draws the overlay over the screen, if it is shown, remembering what was there before.
+        Returns the dirty rects."""
+        if not self.shown:
+            return []
+        now = time.perf_counter()
+        if self.image is None or now - self.last_update >= UPDATE_INTERVAL:
+            self.last_update = now
+            self.image = self.render()
+        self.covered = self.screen.subsurface(self.rect).copy()
+        self.screen.blit(self.image, self.rect)
+        return [self.rect]
+
+    def render(self):
+        """Renders the overlay with the current statistics."""
+        image = pygame.Surface(self.rect.size)
+        image.fill(black)
+        image.set_alpha(OVERLAY_ALPHA)
+        font = get_font(OVERLAY_FONTS, OVERLAY_FONT_SIZE)
+        for i, line in enumerate(self.get_lines()):
+            image.blit(font.render(line, True, white), (5, 5 + i * font.get_linesize()))
+        return image
+
+    def get_lines(self):
+        """Returns the lines of text shown on the overlay."""
+        stats = self.frame_stats
+        phases = stats.get_phase_means()
+        lines = [
+            "FPS %5.1f   frame p50 %6.2f ms   p99 %6.2f ms" %
+            (stats.get_fps(), stats.get_percentile(50) * 1000, stats.get_percentile(99) * 1000),
+            "  ".join("%s %.2f" % (phase, duration * 1000) for phase, duration in phases.items()) + " ms",
+            "idle %5.1f %%" % (self.get_idle_ratio() * 100)
+        ]
+        levels = self.level_cache.get_stats()
+        lines.append("levels: %d hits  %d misses  %d generated (last %.1f ms)" %
+                     (levels["hits"], levels["misses"], levels["generated"], levels["last_generation_time"] * 1000))
+        for name, cache in get_all_stats().items():
+            lines.append("%s: %d hits  %d misses  %d evicted  %.1f/%.0f MB" %
+                         (name, cache["hits"], cache["misses"], cache["evictions"],
+                          cache["bytes"] / 1024 / 1024, cache["budget"] / 1024 / 1024))
+        return lines
@@ -0,0 +1,81 @@
+"""Contains the resource manager, which loads the images and sounds of the game from the locations in
+resource_locations.py. Resources are loaded lazily on their first use or all at once through preload.
+Images are converted to the format of the display, so that blitting them is fast, and every resource is only loaded
+once and then shared. The time it took to load each resource is recorded."""
+import time
+import pygame
+import resource_locations as res
+
+
+class ResourceManager:
+    """Loads and keeps the images and sounds of the game."""
+    def __init__(self):
+        """Initializes a new resource manager without any loaded resources."""
+        self.images = {}
+        self.sounds = {}
+        self.load_times = {}
+
+    def get_image(self, path, size=None, flip=False):
+        """Returns the image at the given path, loading it if necessary.
+        If a size is given, the image is scaled to that size. If flip is True, it is flipped horizontally.
+        :type path: str
+        :type size: tuple
+        :type flip: bool"""
+        key = (path, size, flip)
+        if key not in self.images:
+            if (path, None, False) not in self.images:
+                self.images[(path, None, False)] = self.load(path, load_image)
+            image = self.images[(path, None, False)]
+            if size is not None:
+                image = pygame.transform.scale(image, size)
+            if flip:
+                image = pygame.transform.flip(image, True, False)
+            self.images[key] = image
+        return self.images[key]
+
+    def get_sound(self, path):
+        """Returns the sound at the given path, loading it if necessary. The same sound object is shared by everyone.
+        :type path: str"""
+        if path not in self.sounds:
+            self.sounds[path] = self.load(path, pygame.mixer.Sound)
+        return self.sounds[path]
+
+    def load(self, path, loader):
+        """Loads the resource at the given path with the given loader and records the time it took.
+        :type path: str
+        :type loader: function"""
+        start = time.perf_counter()
+        resource = loader(path)
+        self.load_times[path] = time.perf_counter() - start
+        return resource
+
+    def preload(self, image_paths=(), sound_paths=()):
+        """Loads the given images and sounds right away instead of on their first use.
+        :type image_paths: iterable
+        :type sound_paths: iterable"""
+        for path in image_paths:
+            self.get_image(path)
+        for path in sound_paths:
+            self.get_sound(path)
+
+    def preload_all(self):
+        """Loads all images and sounds listed in resource_locations.py. The music is streamed, so it isn't loaded."""
+        names = dir(res)
+        self.preload([getattr(res, name) for name in names if name.startswith("IMG_") or name.startswith("ICON_")],
+                     [getattr(res, name) for name in names if name.startswith("SOUND_")])
+
+    def get_load_times(self):
+        """Returns the time in seconds it took to load each resource, by the path of the resource."""
+        return dict(self.load_times)
+
+
+def load_image(path):
+    """Loads the image at the given path and converts it to the format of the display, if there is one yet.
+    :type path: str"""
+    image = pygame.image.load(path)
+    if pygame.display.get_surface() is not None:
+        image = image.convert_alpha()
+    return image
+
+
+resources = ResourceManager()
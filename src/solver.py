@@ -0,0 +1,235 @@
+"""The solver for level maps, working on the same tile encoding as the level generator (see level_generator.py).
+It doesn't need to know how a level was generated, so it can also solve hand-made or imported levels.
+Every cell keeps the set of tiles it can still become by rotating as a bitset of 16 bits,
+where bit t is set if the cell can become the tile t. The sets of all cells are narrowed down at once with numpy:
+a cell may only keep the tiles that agree with at least one tile its neighbour can still become on their shared side,
+and the cells at the borders must not have connections leading out of the map.
+This is repeated until nothing changes anymore. Only if some cells are still undecided then,
+the solver picks the cell with the fewest possibilities, tries each of them and backtracks if it leads nowhere.
+After such a decision only the cells around the decided one can change, so from there on the solver only looks at
+the cells whose neighbours changed instead of sweeping over the whole map again."""
+import time
+from collections import deque
+import numpy as np
+from level_generator import LEFT, UP, RIGHT, DOWN, TILE_DTYPE, rotations
+
+
+EMPTY = np.uint16(1 << 0)  # the bitset containing only the empty tile, used for the cells out of the borders
+
+
+def get_tiles_with(side):
+    """Returns the bitset of all tiles that have a connection to the given side.
+    :type side: int"""
+    return np.uint16(sum(1 << tile for tile in range(16) if tile & side))
+
+
+# Use like this: connected[side] is the bitset of the tiles with a connection to that side,
+# not_connected[side] the one of the tiles without
+connected = {side: get_tiles_with(side) for side in (LEFT, UP, RIGHT, DOWN)}
+not_connected = {side: ~connected[side] for side in (LEFT, UP, RIGHT, DOWN)}
+# Use like this: orientations[tile] is the bitset of the tiles the given tile can become by rotating
+orientations = np.array([np.bitwise_or.reduce(np.uint16(1) << rotations[tile]) for tile in range(16)], dtype=np.uint16)
+# Use like this: popcount[bitset] is the number of tiles in the bitset
+popcount = np.array([bin(bitset).count("1") for bitset in range(1 << 16)], dtype=np.uint8)
+# Use like this: tile_of[bitset] is the tile in a bitset containing exactly one tile
+tile_of = {1 << tile: tile for tile in range(16)}
+
+
+def get_allowed_table(side, neighbour_side):
+    """Returns the table of the tiles a cell may become for every bitset of its neighbour on the given side.
+    A cell may have a connection on that side if the neighbour may have one on the opposite side,
+    and it may have none if the neighbour may have none either.
+    :type side: int
+    :type neighbour_side: int"""
+    bitsets = np.arange(1 << 16, dtype=np.uint16)
+    may_connect = (bitsets & connected[neighbour_side]) != 0
+    may_not_connect = (bitsets & not_connected[neighbour_side]) != 0
+    return np.where(may_connect, connected[side], 0).astype(np.uint16) | \
+        np.where(may_not_connect, not_connected[side], 0).astype(np.uint16)
+
+
+# Use like this: allowed[side][bitset] is the bitset of the tiles a cell may become
+# if its neighbour on the given side may become the tiles in the given bitset
+allowed = {
+    LEFT: get_allowed_table(LEFT, RIGHT),
+    UP: get_allowed_table(UP, DOWN),
+    RIGHT: get_allowed_table(RIGHT, LEFT),
+    DOWN: get_allowed_table(DOWN, UP)
+}
+# The offset of the neighbour on each side, the table for that side and the one the neighbour uses for the cell,
+# as plain lists for looking at single cells quickly
+neighbour_tables = [(-1, 0, allowed[LEFT].tolist(), allowed[RIGHT].tolist()),
+                    (0, -1, allowed[UP].tolist(), allowed[DOWN].tolist()),
+                    (1, 0, allowed[RIGHT].tolist(), allowed[LEFT].tolist()),
+                    (0, 1, allowed[DOWN].tolist(), allowed[UP].tolist())]
+
+
+class Solver:
+    """Solves a single level map. Keeps statistics about the search, which can be looked at after solving."""
+    def __init__(self, level_map, cancel=None):
+        """Initializes a new solver for the given level map.
+        Takes an event (anything with an is_set method) that cancels the solver as soon as it is set, if any.
+        :type level_map: ndarray
+        :type cancel: threading.Event"""
+        self.level_map = np.asarray(level_map)
+        self.cancel = cancel
+        self.sweeps = 0
+        self.revisions = 0
+        self.nodes = 0
+        self.decisions = 0
+        self.backtracks = 0
+        self.max_depth = 0
+        self.cancelled = False
+        self.duration = 0.0
+
+    def solve(self):
+        """Solves the level map. Returns the solved level map, which consists of the same tiles rotated,
+        or None if there is no solution or the solver was cancelled."""
+        start = time.perf_counter()
+        domains = self.search(get_domains(self.level_map))
+        self.duration = time.perf_counter() - start
+        if domains is None:
+            return None
+        return get_tiles(domains)
+
+    def search(self, domains):
+        """Narrows down the given domains, backtracking where propagation alone isn't enough.
+        Returns domains containing a single tile per cell, or None if there is no solution or the solver was cancelled.
+        :type domains: ndarray"""
+        if not self.propagate(domains):
+            return None
+        stack = [(domains, 0)]
+        while stack:
+            if self.is_cancelled():
+                return None
+            domains, depth = stack.pop()
+            self.max_depth = max(self.max_depth, depth)
+            sizes = popcount[domains]
+            if (sizes == 1).all():
+                return domains
+            # Deciding on the cell with the fewest possibilities first keeps the search tree narrow
+            cell = np.unravel_index(np.argmin(np.where(sizes > 1, sizes, 17)), domains.shape)
+            self.decisions += 1
+            candidates = [bit for bit in tile_of if domains[cell] & bit]
+            children = []
+            for bit in candidates:
+                child = domains.copy()
+                child[cell] = bit
+                self.nodes += 1
+                if self.propagate_from(child, cell):
+                    children.append((child, depth + 1))
+                else:
+                    self.backtracks += 1
+            stack.extend(reversed(children))
+        return None
+
+    def propagate(self, domains):
+        """Narrows down the given domains in place until every cell only keeps tiles that fit to its neighbours.
+        Returns False if a cell has no possible tile left (or the solver was cancelled), True otherwise.
+        :type domains: ndarray"""
+        while True:
+            if self.is_cancelled():
+                return False
+            self.sweeps += 1
+            narrowed = narrow(domains)
+            if not narrowed.all():
+                return False
+            if np.array_equal(narrowed, domains):
+                return True
+            domains[...] = narrowed
+
+    def propagate_from(self, domains, cell):
+        """Narrows down the given domains in place after the given cell changed, only looking at the cells
+        whose neighbours changed. Returns False if a cell has no possible tile left (or the solver was cancelled),
+        True otherwise.
+        :type domains: ndarray
+        :type cell: tuple"""
+        if self.is_cancelled():
+            return False
+        width, height = domains.shape
+        queue = deque(get_neighbours(cell, width, height))
+        queued = set(queue)
+        while queue:
+            x, y = queue.popleft()
+            queued.discard((x, y))
+            self.revisions += 1
+            domain = domains.item(x, y)
+            narrowed = domain
+            for dx, dy, table, _ in neighbour_tables:
+                nx, ny = x + dx, y + dy
+                if 0 <= nx < width and 0 <= ny < height:
+                    narrowed &= table[domains.item(nx, ny)]
+                else:
+                    narrowed &= table[EMPTY]
+            if narrowed == domain:
+                continue
+            if narrowed == 0:
+                return False
+            domains[x, y] = narrowed
+            # A neighbour only has to be looked at again if what it may become on the shared side changed
+            for dx, dy, _, opposite_table in neighbour_tables:
+                neighbour = (x + dx, y + dy)
+                if 0 <= neighbour[0] < width and 0 <= neighbour[1] < height and neighbour not in queued and \
+                        opposite_table[narrowed] != opposite_table[domain]:
+                    queued.add(neighbour)
+                    queue.append(neighbour)
+        return True
+
+    def is_cancelled(self):
+        """Returns True if the solver was cancelled, remembering it for the statistics."""
+        if self.cancel is not None and self.cancel.is_set():
+            self.cancelled = True
+        return self.cancelled
+
+    def get_stats(self):
+        """Returns the statistics of the search as a dictionary."""
+        return {
+            "sweeps": self.sweeps,
+            "revisions": self.revisions,
+            "nodes": self.nodes,
+            "decisions": self.decisions,
+            "backtracks": self.backtracks,
+            "max_depth": self.max_depth,
+            "cancelled": self.cancelled,
+            "duration": self.duration
+        }
+
+
+def solve(level_map, cancel=None):
+    """Solves the given level map. Returns the solved level map or None if there is no solution
+    or the given cancel event was set.
+    :type level_map: ndarray
+    :type cancel: threading.Event"""
+    return Solver(level_map, cancel).solve()
+
+
+def get_domains(level_map):
+    """Returns the bitsets of the tiles every cell of the given level map can become by rotating.
+    :type level_map: ndarray"""
+    return orientations[np.asarray(level_map)]
+
+
+def get_tiles(domains):
+    """Returns the level map of the given domains, which must contain a single tile per cell.
+    :type domains: ndarray"""
+    return np.log2(domains).astype(TILE_DTYPE)
+
+
+def narrow(domains):
+    """Returns the given domains with every cell only keeping the tiles that agree with at least one possible tile
+    of each of its neighbours on their shared side. Cells out of the borders are empty.
+    :type domains: ndarray"""
+    padded = np.full((domains.shape[0] + 2, domains.shape[1] + 2), EMPTY, dtype=np.uint16)
+    padded[1:-1, 1:-1] = domains
+    return domains & allowed[LEFT][padded[:-2, 1:-1]] & allowed[UP][padded[1:-1, :-2]] & \
+        allowed[RIGHT][padded[2:, 1:-1]] & allowed[DOWN][padded[1:-1, 2:]]
+
+
+def get_neighbours(cell, width, height):
+    """Returns the cells next to the given one that are within a map of the given size.
+    :type cell: tuple
+    :type width: int
+    :type height: int"""
+    x, y = cell
+    return [(nx, ny) for nx, ny in ((x - 1, y), (x, y - 1), (x + 1, y), (x, y + 1))
+            if 0 <= nx < width and 0 <= ny < height]
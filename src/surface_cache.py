@@ -0,0 +1,77 @@
+"""Contains the surface cache, a cache for rendered images that keeps the most recently used ones
+within a budget of bytes, computed from the size of the images. Used for the tile images and the rendered text.
+Every cache counts its hits, misses and evictions, which can be looked at for all caches through get_all_stats."""
+from collections import OrderedDict
+
+
+# all surface caches by their name
+caches = {}
+
+
+class SurfaceCache:
+    """A least recently used cache for surfaces (or lists of surfaces) with a budget in bytes."""
+    def __init__(self, name, budget):
+        """Initializes a new surface cache with the given name and budget in bytes.
+        :type name: str
+        :type budget: int"""
+        self.name = name
+        self.budget = budget
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        caches[name] = self
+
+    def get(self, key):
+        """Returns the surface stored for the given key and marks it as recently used. Returns None if there is none."""
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return value[0]
+
+    def put(self, key, surface):
+        """Stores the given surface (or list of surfaces) for the given key.
+        Evicts the least recently used surfaces until the cache fits into its budget again.
+        The surface just stored is never evicted, even if it is bigger than the whole budget."""
+        if key in self.entries:
+            self.size -= self.entries.pop(key)[1]
+        size = get_size(surface)
+        self.entries[key] = (surface, size)
+        self.size += size
+        while self.size > self.budget and len(self.entries) > 1:
+            _, (_, evicted_size) = self.entries.popitem(last=False)
+            self.size -= evicted_size
+            self.evictions += 1
+        return surface
+
+    def clear(self):
+        """Removes all surfaces from the cache."""
+        self.entries.clear()
+        self.size = 0
+
+    def get_stats(self):
+        """Returns the statistics of this cache as a dictionary."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self.entries),
+            "bytes": self.size,
+            "budget": self.budget
+        }
+
+
+def get_size(surface):
+    """Returns the number of bytes the pixels of the given surface (or list of surfaces) take up."""
+    if isinstance(surface, (list, tuple)):
+        return sum(get_size(s) for s in surface)
+    return surface.get_width() * surface.get_height() * surface.get_bytesize()
+
+
+def get_all_stats():
+    """Returns the statistics of all surface caches as a dictionary by the name of the cache."""
+    return {name: cache.get_stats() for name, cache in caches.items()}
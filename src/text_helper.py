@@ -1,6 +1,10 @@
 """A helper class for rendering text.
 Caches fonts and rendered text images to reduce load on the system when rendering stuff like menus."""
 import pygame
+from surface_cache import SurfaceCache
+
+
+TEXT_CACHE_BUDGET = 8 * 1024 * 1024  # bytes for the rendered text images
 
 
 def make_font(fonts, size):
@@ -28,7 +32,7 @@ def get_font(font_preferences, size):
     return font
 
 
-__text_cache = {}
+__text_cache = SurfaceCache("text", TEXT_CACHE_BUDGET)
 
 
 def create_text(text, fonts, size, color):
@@ -39,9 +43,8 @@ def create_text(text, fonts, size, color):
     :type size: int
     :type color: tuple"""
     key = '|'.join(map(str, (fonts, size, color, text)))
-    image = __text_cache.get(key, None)
+    image = __text_cache.get(key)
     if image is None:
         font = get_font(fonts, size)
-        image = font.render(text, True, color)
-        __text_cache[key] = image
+        image = __text_cache.put(key, font.render(text, True, color))
     return image
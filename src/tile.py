@@ -3,9 +3,13 @@ from pygame.sprite import Sprite
 from enums import TileType, GameStyle
 import pygame
 import resource_locations as res
+from surface_cache import SurfaceCache
+from resource_manager import resources
 
 
 TURN_SPEED = 10  # 90 NEEDS to be divisible by this, or else the animation will bug
+FRAMES_PER_TURN = 90 // TURN_SPEED  # the number of animation frames for a quarter turn
+FRAMES = 4 * FRAMES_PER_TURN  # the number of animation frames for a full turn
 
 
 class Tile(Sprite):
@@ -24,22 +28,23 @@ class Tile(Sprite):
         Sprite.__init__(self)
         self.tile_type = tile_type
         self.rotation = rotation
-        self.animated_rotation = self.rotation * 90
+        self.frame = self.rotation * FRAMES_PER_TURN
         self.shape = shape
         self.pos = pos
         self.grid_pos = grid_pos
         self.style = style
-        self.image = get_image_for(self.tile_type, self.animated_rotation, self.shape, self.style)
+        self.frames = get_frames(self.tile_type, self.shape, self.style)
+        self.image = self.frames[self.frame]
         self.rect = self.image.get_rect()
         self.rect.x = self.pos[0]
         self.rect.y = self.pos[1]
         self.animation_running = 0
 
     def update(self):
-        """Updates the tile. Used for the rotation animation."""
+        """Updates the tile. Used for the rotation animation, which advances by one frame each tick."""
         if self.animation_running != 0:
-            step = TURN_SPEED * (self.animation_running / abs(self.animation_running))
-            self.animated_rotation += step
+            step = 1 if self.animation_running > 0 else -1
+            self.frame = (self.frame + step) % FRAMES
             self.animation_running -= step
             self.update_image()
 
@@ -48,7 +53,7 @@ class Tile(Sprite):
         self.rotation -= 1
         if self.rotation < 0:
             self.rotation = 3
-        self.animation_running -= 90
+        self.animation_running -= FRAMES_PER_TURN
         self.update_image()
 
     def rotate_ccw(self):
@@ -56,16 +61,23 @@ class Tile(Sprite):
         self.rotation += 1
         if self.rotation > 3:
             self.rotation = 0
-        self.animation_running += 90
+        self.animation_running += FRAMES_PER_TURN
         self.update_image()
 
     def update_image(self):
-        """Updates the image of the sprite."""
-        self.image = get_image_for(self.tile_type, self.animated_rotation, self.shape, self.style)
+        """Updates the image of the sprite to the current animation frame."""
+        self.image = self.frames[self.frame]
         self.rect = self.image.get_rect()   # type: pygame.Rect
         self.rect.centerx = self.pos[0] + (self.shape[0] / 2)
         self.rect.centery = self.pos[1] + (self.shape[1] / 2)
 
+    def move(self, dx, dy):
+        """Moves the tile by the given number of pixels on the screen, used when the camera moves.
+        :type dx: int
+        :type dy: int"""
+        self.pos = (self.pos[0] + dx, self.pos[1] + dy)
+        self.rect.move_ip(dx, dy)
+
     def is_pos_on_tile(self, pos):
         """Returns true if the given position is on this tile. Used for click recognition."""
         return self.pos[0] < pos[0] < self.pos[0] + self.shape[0] and self.pos[1] < pos[1] < self.pos[1] + self.shape[1]
@@ -91,27 +103,53 @@ def get_tile_as_num(tile_type, rotation):
     return tile_info[tile_type][rotation]
 
 
-cached_images = {}
+TILE_IMAGE_BUDGET = 16 * 1024 * 1024  # bytes for the scaled tile images
+FRAME_ATLAS_BUDGET = 64 * 1024 * 1024  # bytes for the animation frames, enough for the biggest tiles of one style
+cached_images = SurfaceCache("tile images", TILE_IMAGE_BUDGET)
 
 
 def get_image_for(tile_type, rotation, shape, style):
     """Returns the image for the given tile type, rotation and size.
-    Rotation can be either 0, 1, 2 or 3.
-    Rotation is counted counterclockwise from the original image.
+    Rotation is given in degrees, counted counterclockwise from the original image.
     Size is the number of pixels the image should be wide and high.
+    Only the scaled image is cached, rotated images are kept in the frame atlas.
     :type tile_type: TileType
     :type rotation: int
     :type shape: tuple
     :type style: GameStyle"""
-    key = (tile_type, rotation, shape, style)
-    if key not in cached_images:
-        key2 = (tile_type, 0, shape, style)
-        if key2 not in cached_images:
-            if (tile_type, style) not in cached_images:
-                cached_images[(tile_type, style)] = load_image(tile_type, style)
-            cached_images[key2] = pygame.transform.scale(cached_images[(tile_type, style)], shape)
-        cached_images[key] = pygame.transform.rotate(cached_images[key2], rotation)
-    return cached_images[key]
+    key = (tile_type, shape, style)
+    image = cached_images.get(key)
+    if image is None:
+        image = cached_images.put(key, pygame.transform.scale(load_image(tile_type, style), shape))
+    if rotation % 360 == 0:
+        return image
+    return pygame.transform.rotate(image, rotation)
+
+
+frame_atlas = SurfaceCache("tile frames", FRAME_ATLAS_BUDGET)
+
+
+def build_frame_atlas(shape, style):
+    """Builds the animation frames of all tile types for the given size and style.
+    Called when a level is loaded, so that no image needs to be scaled or rotated while the tiles are animated.
+    :type shape: tuple
+    :type style: GameStyle"""
+    for tile_type in TileType:
+        get_frames(tile_type, shape, style)
+
+
+def get_frames(tile_type, shape, style):
+    """Returns the list of animation frames for the given tile type, size and style.
+    Frame i shows the tile rotated counterclockwise by i * TURN_SPEED degrees.
+    :type tile_type: TileType
+    :type shape: tuple
+    :type style: GameStyle"""
+    key = (tile_type, shape, style)
+    frames = frame_atlas.get(key)
+    if frames is None:
+        frames = frame_atlas.put(key, [get_image_for(tile_type, frame * TURN_SPEED, shape, style)
+                                       for frame in range(FRAMES)])
+    return frames
 
 
 base_images = {
@@ -133,7 +171,7 @@ base_images = {
 
 
 def load_image(tile_type, style):
-    """Loads the base image for the given tile type.
+    """Returns the base image for the given tile type, loaded through the resource manager.
     :type tile_type: TileType
     :type style: GameStyle"""
-    return pygame.image.load(base_images[style][tile_type])
+    return resources.get_image(base_images[style][tile_type])